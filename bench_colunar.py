@@ -0,0 +1,106 @@
+# bench_colunar.py
+"""
+Benchmark da saída colunar (colunar.py) com os dados sintéticos do
+bench_relatorio_excel.py: por padrão 100 mil notas / 1 milhão de itens.
+Mede a montagem das tabelas Arrow, a gravação do Parquet e do Arrow IPC e,
+principalmente, a leitura: o .arrow aberto por memory map deve ficar na casa
+dos milissegundos. Confere os totais lidos e falha se a leitura passar do
+orçamento:
+
+    python bench_colunar.py
+    python bench_colunar.py --notas 20000 --comparar-excel
+    ORCAMENTO_LEITURA_MS=100 python bench_colunar.py
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+from bench_relatorio_excel import notas_sinteticas
+from colunar import gravar_arrow, gravar_parquet, ler_tabela, montar_tabelas, pyarrow_disponivel
+
+ORCAMENTO_LEITURA_MS = float(os.getenv("ORCAMENTO_LEITURA_MS", "50"))
+
+
+def medir(funcao, *args):
+    inicio = time.perf_counter()
+    resultado = funcao(*args)
+    return resultado, (time.perf_counter() - inicio) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark da saída Parquet/Arrow")
+    parser.add_argument("--notas", type=int, default=100_000)
+    parser.add_argument("--itens-por-nota", type=int, default=10)
+    parser.add_argument("--emitentes", type=int, default=500)
+    parser.add_argument("--semente", type=int, default=42)
+    parser.add_argument("--orcamento-ms", type=float, default=ORCAMENTO_LEITURA_MS)
+    parser.add_argument(
+        "--comparar-excel", action="store_true", help="grava e relê o Excel para comparar (lento)"
+    )
+    args = parser.parse_args()
+
+    if not pyarrow_disponivel():
+        print("FALHOU: pyarrow não instalado (pip install -r requirements.txt)")
+        sys.exit(1)
+    import pyarrow.compute as pc
+
+    notas = notas_sinteticas(args.notas, args.itens_por_nota, args.emitentes, args.semente)
+    total_nf = sum(n.total_nf_centavos for n in notas)
+    v_prod = sum(i.v_prod_centavos for n in notas for i in n.itens)
+
+    with tempfile.TemporaryDirectory() as pasta:
+        tabelas, montagem = medir(montar_tabelas, notas)
+        nomes, parquet = medir(gravar_parquet, pasta, "relatorio.xlsx", tabelas)
+        _, arrow = medir(gravar_arrow, pasta, tabelas)
+        del tabelas
+
+        print(f"{args.notas} notas, {args.notas * args.itens_por_nota} itens")
+        print(f"montagem das tabelas: {montagem:.0f} ms")
+        print(f"gravação parquet: {parquet:.0f} ms | arrow: {arrow:.0f} ms")
+        for nome in sorted(os.listdir(pasta)):
+            print(f"  {nome}: {os.path.getsize(os.path.join(pasta, nome)) / 1e6:.1f} MB")
+
+        notas_arrow, leitura_notas = medir(ler_tabela, os.path.join(pasta, "notas.arrow"))
+        itens_arrow, leitura_itens = medir(ler_tabela, os.path.join(pasta, "itens.arrow"))
+        leitura = leitura_notas + leitura_itens
+        por_emitente, agregacao = medir(
+            lambda: itens_arrow.group_by("cnpj_emit").aggregate([("v_prod_centavos", "sum")])
+        )
+        _, leitura_parquet = medir(ler_tabela, os.path.join(pasta, nomes["itens"]))
+
+        print(f"leitura arrow (memory map), notas + itens: {leitura:.1f} ms")
+        print(f"soma de v_prod por CNPJ nos itens: {agregacao:.1f} ms ({por_emitente.num_rows} emitentes)")
+        print(f"leitura parquet dos itens: {leitura_parquet:.0f} ms")
+
+        divergencias = []
+        if pc.sum(notas_arrow["total_nf_centavos"]).as_py() != total_nf:
+            divergencias.append("soma de total_nf_centavos diverge")
+        if pc.sum(por_emitente["v_prod_centavos_sum"]).as_py() != v_prod:
+            divergencias.append("soma de v_prod_centavos diverge")
+        if itens_arrow.num_rows != args.notas * args.itens_por_nota:
+            divergencias.append(f"{itens_arrow.num_rows} itens lidos")
+
+        if args.comparar_excel:
+            import pandas as pd
+
+            from relatorio_excel import gerar_relatorio_excel
+
+            caminho = os.path.join(pasta, "relatorio.xlsx")
+            gerar_relatorio_excel(caminho, notas)
+            _, excel = medir(pd.read_excel, caminho, "Relatorio")
+            print(f"leitura do Excel (aba Relatorio, pandas): {excel:.0f} ms")
+
+    if divergencias:
+        print("FALHOU:", "; ".join(divergencias))
+        sys.exit(1)
+    if leitura > args.orcamento_ms:
+        print(f"FALHOU: leitura acima do orçamento ({args.orcamento_ms:.0f} ms)")
+        sys.exit(1)
+    print("OK")
+
+
+if __name__ == "__main__":
+    main()
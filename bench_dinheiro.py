@@ -0,0 +1,86 @@
+# bench_dinheiro.py
+"""
+Benchmark dos totais em centavos (dinheiro.py / modelos.totais_centavos)
+contra a soma em float que o /processar-nfes fazia antes, com valores
+decimais sintéticos como os do XML (vNF/vICMS com 2 casas):
+
+    python bench_dinheiro.py
+    python bench_dinheiro.py --notas 1000000
+
+Confere que a soma em centavos bate com a soma exata (Decimal) e mostra a
+deriva do float. Só falha se os totais divergirem: os tempos são
+informativos. As duas somas percorrem os registros em Python e ficam na
+mesma ordem de grandeza, com variação de uma execução para outra maior que
+a diferença entre elas, então não servem de critério de aprovação.
+"""
+
+import argparse
+import random
+import sys
+import time
+from decimal import Decimal
+
+from dinheiro import formatar_decimal, para_centavos
+from modelos import NotaFiscal, totais_centavos
+
+def melhor_tempo_ms(funcao, repeticoes: int = 7):
+    melhor = float("inf")
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        resultado = funcao()
+        melhor = min(melhor, time.perf_counter() - inicio)
+    return resultado, melhor * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark dos totais em centavos")
+    parser.add_argument("--notas", type=int, default=100_000)
+    parser.add_argument("--semente", type=int, default=42)
+    args = parser.parse_args()
+
+    sorteio = random.Random(args.semente)
+    textos = [
+        (f"{sorteio.randint(1, 5_000_000) / 100:.2f}", f"{sorteio.randint(0, 900_000) / 100:.2f}")
+        for _ in range(args.notas)
+    ]
+    exato_nf = sum(Decimal(v_nf) for v_nf, _ in textos)
+    exato_icms = sum(Decimal(v_icms) for _, v_icms in textos)
+
+    # Os mesmos registros nos dois casos; antes os campos eram float do texto
+    # do XML, acumulados com +=
+    notas_float = [
+        NotaFiscal("nfe.xml", "", "", float(v_nf), float(v_icms)) for v_nf, v_icms in textos
+    ]
+    notas = [
+        NotaFiscal("nfe.xml", "", "", para_centavos(v_nf), para_centavos(v_icms))
+        for v_nf, v_icms in textos
+    ]
+
+    def somar_float():
+        total_nf = total_icms = 0.0
+        for nota in notas_float:
+            total_nf += nota.total_nf_centavos
+            total_icms += nota.icms_centavos
+        return total_nf, total_icms
+
+    (float_nf, float_icms), tempo_float = melhor_tempo_ms(somar_float)
+    (centavos_nf, centavos_icms), tempo_centavos = melhor_tempo_ms(lambda: totais_centavos(notas))
+    _, tempo_parse_float = melhor_tempo_ms(lambda: [float(v) for v, _ in textos], 3)
+    _, tempo_parse_centavos = melhor_tempo_ms(lambda: [para_centavos(v) for v, _ in textos], 3)
+
+    print(f"{args.notas} notas")
+    print(f"parse vNF: float {tempo_parse_float:.1f} ms | centavos {tempo_parse_centavos:.1f} ms")
+    print(f"soma float: {tempo_float:.1f} ms | soma centavos: {tempo_centavos:.1f} ms")
+    print(f"total exato: {exato_nf} | centavos: {formatar_decimal(centavos_nf)} | float: {float_nf!r}")
+    print(f"deriva do float: {Decimal(repr(float_nf)) - exato_nf} (vNF), "
+          f"{Decimal(repr(float_icms)) - exato_icms} (vICMS)")
+
+    exatos = (Decimal(formatar_decimal(centavos_nf)), Decimal(formatar_decimal(centavos_icms)))
+    if exatos != (exato_nf, exato_icms):
+        print("FALHOU: soma em centavos diverge da soma exata")
+        sys.exit(1)
+    print("OK")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,155 @@
+# bench_relatorio_excel.py
+"""
+Benchmark da geração do relatório Excel (relatorio_excel.py) com dados
+sintéticos: por padrão 100 mil notas com 10 itens cada (1 milhão de linhas na
+aba Itens). Mede a montagem das abas (pandas) e a escrita do .xlsx, confere o
+zip gerado e falha se o tempo total passar do orçamento:
+
+    python bench_relatorio_excel.py
+    python bench_relatorio_excel.py --notas 20000 --itens-por-nota 5 --workers 1
+    python bench_relatorio_excel.py --notas 5000 --verificar
+    ORCAMENTO_RELATORIO_S=60 python bench_relatorio_excel.py
+"""
+
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+import zipfile
+
+from modelos import ItemNota, NotaFiscal
+from relatorio_excel import MAX_WORKERS_EXCEL, escrever_xlsx, montar_planilhas
+
+ORCAMENTO_RELATORIO_S = float(os.getenv("ORCAMENTO_RELATORIO_S", "30"))
+
+PRODUTOS = ("Agua Mineral", "Notebook Ryzen 5", "Colchão Casal", "Cadeira Gamer", "Café 500g & Filtro")
+NAT_OP = ("Venda", "Venda Mercadoria", "Devolução", "Remessa")
+UFS = ("SP", "RJ", "MG", "AM", "RS", "BA")
+
+
+def notas_sinteticas(quantidade: int, itens_por_nota: int, emitentes: int, semente: int):
+    sorteio = random.Random(semente)
+    cadastro = [(f"{i:014d}", f"EMITENTE {i} LTDA") for i in range(1, emitentes + 1)]
+    notas = []
+    for n in range(quantidade):
+        cnpj, nome = sorteio.choice(cadastro)
+        mes = f"2024-{sorteio.randint(1, 12):02d}"
+        itens = []
+        for i in range(1, itens_por_nota + 1):
+            v_prod = sorteio.randint(100, 500_000)
+            itens.append(
+                ItemNota(
+                    n_item=i,
+                    c_prod=f"{sorteio.randint(1, 99999):05d}",
+                    x_prod=sorteio.choice(PRODUTOS),
+                    cfop="5102",
+                    q_com=float(sorteio.randint(1, 100)),
+                    v_prod_centavos=v_prod,
+                    icms_centavos=v_prod * 18 // 100,
+                )
+            )
+        notas.append(
+            NotaFiscal(
+                arquivo=f"nfe_{n:06d}.xml",
+                cnpj_emit=cnpj,
+                nome_emit=nome,
+                total_nf_centavos=sum(i.v_prod_centavos for i in itens),
+                icms_centavos=sum(i.icms_centavos for i in itens),
+                mes=mes,
+                uf=sorteio.choice(UFS),
+                nat_op=sorteio.choice(NAT_OP),
+                chave=f"{35240100000000000000550010000000000000000000 + n:044d}",
+                data_emissao=f"{mes}-{sorteio.randint(1, 28):02d}T{sorteio.randint(0, 23):02d}:00:00-03:00",
+                itens=tuple(itens),
+            )
+        )
+    return notas
+
+
+def verificar(caminho: str, notas) -> list:
+    """Relê o .xlsx e compara linhas e totais de cada aba com as notas."""
+    import pandas as pd
+
+    abas = pd.read_excel(caminho, sheet_name=None)
+    total_nf = sum(n.total_nf_centavos for n in notas)
+    itens = sum(len(n.itens) for n in notas)
+    v_prod = sum(i.v_prod_centavos for n in notas for i in n.itens)
+    # aba -> (linhas, coluna somada, soma em centavos, tem linha TOTAL)
+    esperado = {
+        "Relatorio": (len(notas) + 1, "total_nf", total_nf, True),
+        "Por Emitente": (len({(n.cnpj_emit, n.nome_emit) for n in notas}) + 1, "total_nf", total_nf, True),
+        "Itens": (itens, "v_prod", v_prod, False),
+    }
+    divergencias = []
+    for nome, (linhas, coluna, centavos, tem_total) in esperado.items():
+        df = abas.get(nome)
+        if df is None:
+            divergencias.append(f"aba {nome} ausente")
+            continue
+        if len(df) != linhas:
+            divergencias.append(f"{nome}: {len(df)} linhas, esperado {linhas}")
+        valores = df[coluna].to_numpy()
+        somados = valores[:-1] if tem_total else valores
+        if round(somados.sum() * 100) != centavos or (tem_total and round(valores[-1] * 100) != centavos):
+            divergencias.append(f"{nome}: soma de {coluna} diverge")
+    print("verificação:", "OK" if not divergencias else "divergências")
+    return divergencias
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark do relatório Excel")
+    parser.add_argument("--notas", type=int, default=100_000)
+    parser.add_argument("--itens-por-nota", type=int, default=10)
+    parser.add_argument("--emitentes", type=int, default=500)
+    parser.add_argument("--workers", type=int, default=MAX_WORKERS_EXCEL)
+    parser.add_argument("--semente", type=int, default=42)
+    parser.add_argument("--orcamento-s", type=float, default=ORCAMENTO_RELATORIO_S)
+    parser.add_argument(
+        "--verificar", action="store_true", help="relê as abas com pandas e confere os totais (lento)"
+    )
+    args = parser.parse_args()
+
+    inicio = time.perf_counter()
+    notas = notas_sinteticas(args.notas, args.itens_por_nota, args.emitentes, args.semente)
+    print(f"dados sintéticos: {args.notas} notas, {args.notas * args.itens_por_nota} itens "
+          f"({time.perf_counter() - inicio:.2f} s, fora do orçamento)")
+
+    with tempfile.TemporaryDirectory() as pasta:
+        caminho = os.path.join(pasta, "relatorio.xlsx")
+
+        inicio = time.perf_counter()
+        planilhas = montar_planilhas(notas)
+        montagem = time.perf_counter() - inicio
+
+        inicio = time.perf_counter()
+        escrever_xlsx(caminho, planilhas, args.workers)
+        escrita = time.perf_counter() - inicio
+
+        tamanho = os.path.getsize(caminho)
+        with zipfile.ZipFile(caminho) as zipado:
+            corrompido = zipado.testzip()
+        divergencias = verificar(caminho, notas) if args.verificar else []
+
+    for planilha in planilhas:
+        print(f"  aba {planilha.nome!r}: {len(planilha.df)} linhas x {planilha.df.shape[1]} colunas")
+    total = montagem + escrita
+    print(f"montagem das abas (pandas): {montagem:.2f} s")
+    print(f"escrita do .xlsx ({args.workers} workers): {escrita:.2f} s")
+    print(f"total: {total:.2f} s | orçamento: {args.orcamento_s:.0f} s | arquivo: {tamanho / 1e6:.1f} MB")
+
+    if corrompido:
+        print(f"FALHOU: CRC inválido em {corrompido}")
+        sys.exit(1)
+    if divergencias:
+        print("FALHOU:", "; ".join(divergencias))
+        sys.exit(1)
+    if total > args.orcamento_s:
+        print("FALHOU: geração acima do orçamento")
+        sys.exit(1)
+    print("OK")
+
+
+if __name__ == "__main__":
+    main()
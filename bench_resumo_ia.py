@@ -0,0 +1,179 @@
+# bench_resumo_ia.py
+"""
+Teste de carga do /resumo-ia: vazão, latência de cauda e efetividade do cache.
+
+Com --subir-servidores o script sobe sozinho o stub de LLM (stub_llm.py) e o
+app apontando para ele (LLM_BACKEND=stub), então roda sem rede e sem chave:
+
+    python bench_resumo_ia.py --subir-servidores --usuarios 20 --requisicoes 400
+
+Contra um app já em execução:
+
+    python bench_resumo_ia.py --url http://127.0.0.1:8000
+
+Antes da carga são gerados `--relatorios` relatórios diferentes (via
+/processar-nfes com nfe_teste.xml repetido 1..N vezes); cada requisição pede o
+resumo de um deles, então a taxa de acerto esperada é 1 - relatorios/requisicoes.
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import statistics
+import subprocess
+import sys
+import time
+from collections import Counter
+
+import httpx
+
+DIRETORIO = os.path.dirname(os.path.abspath(__file__))
+XML_EXEMPLO = os.path.join(DIRETORIO, "nfe_teste.xml")
+
+
+def percentil(valores, p: float) -> float:
+    if not valores:
+        return 0.0
+    ordenados = sorted(valores)
+    indice = min(len(ordenados) - 1, max(0, round(p / 100 * len(ordenados)) - 1))
+    return ordenados[indice]
+
+
+def subir(comando, env, url_health: str, timeout: float = 30.0) -> subprocess.Popen:
+    processo = subprocess.Popen(comando, cwd=DIRETORIO, env=env)
+    limite = time.monotonic() + timeout
+    while time.monotonic() < limite:
+        try:
+            if httpx.get(url_health, timeout=1).status_code < 500:
+                return processo
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.2)
+    processo.terminate()
+    raise RuntimeError(f"Servidor não respondeu em {url_health}")
+
+
+def subir_servidores(args) -> list:
+    env = dict(os.environ)
+    env.setdefault("STUB_LATENCIA_MS", str(args.latencia_stub_ms))
+    env.setdefault("STUB_LIMITE_RPS", str(args.limite_rps_stub))
+    url_stub = f"http://127.0.0.1:{args.porta_stub}"
+    stub = subir(
+        [sys.executable, "-m", "uvicorn", "stub_llm:app", "--port", str(args.porta_stub), "--log-level", "warning"],
+        env,
+        f"{url_stub}/estatisticas",
+    )
+
+    env.update({"LLM_BACKEND": "stub", "LLM_STUB_URL": url_stub})
+    porta_app = httpx.URL(args.url).port or 8000
+    app = subir(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(porta_app), "--log-level", "warning"],
+        env,
+        f"{args.url}/health",
+    )
+    return [app, stub]
+
+
+async def preparar_relatorios(cliente: httpx.AsyncClient, quantidade: int) -> list:
+    with open(XML_EXEMPLO, "rb") as f:
+        xml = f.read()
+    relatorios = []
+    for i in range(quantidade):
+        arquivos = [("files", (f"nfe_{j}.xml", xml, "text/xml")) for j in range(i + 1)]
+        resposta = await cliente.post("/processar-nfes", files=arquivos)
+        resposta.raise_for_status()
+        relatorios.append(resposta.json()["relatorio_excel"])
+    return relatorios
+
+
+async def usuario(cliente, fila: asyncio.Queue, relatorios, sorteio, resultados, stream: bool):
+    rota = "/resumo-ia/stream" if stream else "/resumo-ia"
+    while True:
+        try:
+            fila.get_nowait()
+        except asyncio.QueueEmpty:
+            return
+        params = {"nome_arquivo": sorteio.choice(relatorios)}
+        inicio = time.perf_counter()
+        primeiro_byte = None
+        try:
+            async with cliente.stream("GET", rota, params=params) as resposta:
+                async for _ in resposta.aiter_bytes():
+                    if primeiro_byte is None:
+                        primeiro_byte = time.perf_counter() - inicio
+                status = resposta.status_code
+        except httpx.HTTPError as e:
+            status = type(e).__name__
+        resultados.append((status, time.perf_counter() - inicio, primeiro_byte))
+
+
+async def rodar(args):
+    async with httpx.AsyncClient(base_url=args.url, timeout=args.timeout) as cliente:
+        relatorios = await preparar_relatorios(cliente, args.relatorios)
+        antes = (await cliente.get("/resumo-ia/estatisticas")).json()
+
+        fila: asyncio.Queue = asyncio.Queue()
+        for _ in range(args.requisicoes):
+            fila.put_nowait(None)
+
+        sorteio = random.Random(args.semente)
+        resultados = []
+        inicio = time.perf_counter()
+        await asyncio.gather(
+            *(
+                usuario(cliente, fila, relatorios, sorteio, resultados, args.stream)
+                for _ in range(args.usuarios)
+            )
+        )
+        duracao = time.perf_counter() - inicio
+        depois = (await cliente.get("/resumo-ia/estatisticas")).json()
+
+    latencias_ms = [r[1] * 1000 for r in resultados if r[0] == 200]
+    primeiros_ms = [r[2] * 1000 for r in resultados if r[0] == 200 and r[2] is not None]
+    acertos = depois["acertos"] - antes["acertos"]
+    faltas = depois["faltas"] - antes["faltas"]
+
+    print(f"requisições: {len(resultados)} | usuários: {args.usuarios} | relatórios distintos: {len(relatorios)}")
+    print(f"duração: {duracao:.2f} s | vazão: {len(resultados) / duracao:.1f} req/s")
+    print("status:", dict(Counter(r[0] for r in resultados)))
+    if latencias_ms:
+        print(
+            "latência (ms): "
+            f"p50 {percentil(latencias_ms, 50):.1f} | p90 {percentil(latencias_ms, 90):.1f} | "
+            f"p95 {percentil(latencias_ms, 95):.1f} | p99 {percentil(latencias_ms, 99):.1f} | "
+            f"máx {max(latencias_ms):.1f} | média {statistics.mean(latencias_ms):.1f}"
+        )
+    if args.stream and primeiros_ms:
+        print(f"primeiro byte (ms): p50 {percentil(primeiros_ms, 50):.1f} | p95 {percentil(primeiros_ms, 95):.1f}")
+    total_cache = acertos + faltas
+    taxa = acertos / total_cache if total_cache else 0.0
+    print(f"cache: {acertos} acertos / {faltas} faltas (taxa {taxa:.1%})")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Teste de carga do /resumo-ia")
+    parser.add_argument("--url", default="http://127.0.0.1:8000")
+    parser.add_argument("--usuarios", type=int, default=10)
+    parser.add_argument("--requisicoes", type=int, default=200)
+    parser.add_argument("--relatorios", type=int, default=5)
+    parser.add_argument("--stream", action="store_true", help="usa /resumo-ia/stream")
+    parser.add_argument("--timeout", type=float, default=60.0)
+    parser.add_argument("--semente", type=int, default=42)
+    parser.add_argument("--subir-servidores", action="store_true")
+    parser.add_argument("--porta-stub", type=int, default=8001)
+    parser.add_argument("--latencia-stub-ms", type=float, default=300)
+    parser.add_argument("--limite-rps-stub", type=float, default=0)
+    args = parser.parse_args()
+
+    processos = subir_servidores(args) if args.subir_servidores else []
+    try:
+        asyncio.run(rodar(args))
+    finally:
+        for processo in processos:
+            processo.terminate()
+            processo.wait()
+
+
+if __name__ == "__main__":
+    main()
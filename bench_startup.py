@@ -0,0 +1,98 @@
+# bench_startup.py
+"""
+Benchmark de cold start: mede o tempo de `import main` em processos novos
+e confere que as dependências pesadas continuam sendo carregadas só sob demanda.
+
+Uso:
+    python bench_startup.py                 # 5 execuções, orçamento padrão
+    python bench_startup.py --execucoes 10 --orcamento-ms 500
+    python bench_startup.py --detalhes      # top imports via -X importtime
+
+Sai com código 1 se a mediana passar do orçamento ou se algum módulo pesado
+for importado junto com o app.
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+DIRETORIO = os.path.dirname(os.path.abspath(__file__))
+
+# Orçamento do import do app (ms); pode ser ajustado por variável de ambiente
+ORCAMENTO_IMPORT_MS = float(os.getenv("ORCAMENTO_IMPORT_MS", "600"))
+
+# Não podem ser carregados no import de main.py
+MODULOS_PESADOS = ("pandas", "numpy", "openpyxl", "pyarrow", "reportlab", "groq", "dotenv")
+
+SCRIPT_MEDICAO = f"""
+import json, sys, time
+t0 = time.perf_counter()
+import main
+ms = (time.perf_counter() - t0) * 1000
+pesados = [m for m in {MODULOS_PESADOS!r} if m in sys.modules]
+print(json.dumps({{"ms": ms, "pesados": pesados}}))
+"""
+
+
+def medir_import() -> dict:
+    saida = subprocess.run(
+        [sys.executable, "-c", SCRIPT_MEDICAO],
+        cwd=DIRETORIO,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    return json.loads(saida.stdout.strip().splitlines()[-1])
+
+
+def top_imports(limite: int = 15) -> list:
+    """Maiores tempos cumulativos reportados por `python -X importtime`."""
+    saida = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import main"],
+        cwd=DIRETORIO,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    linhas = []
+    for linha in saida.stderr.splitlines():
+        if not linha.startswith("import time:") or "cumulative" in linha:
+            continue
+        _proprio, cumulativo, modulo = (c.strip() for c in linha[len("import time:"):].split("|"))
+        linhas.append((int(cumulativo), modulo))
+    linhas.sort(reverse=True)
+    return linhas[:limite]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--execucoes", type=int, default=5)
+    parser.add_argument("--orcamento-ms", type=float, default=ORCAMENTO_IMPORT_MS)
+    parser.add_argument("--detalhes", action="store_true")
+    args = parser.parse_args()
+
+    medicoes = [medir_import() for _ in range(args.execucoes)]
+    tempos = [m["ms"] for m in medicoes]
+    pesados = sorted({p for m in medicoes for p in m["pesados"]})
+    mediana = statistics.median(tempos)
+
+    print(f"import main: mediana {mediana:.0f} ms | mín {min(tempos):.0f} ms | máx {max(tempos):.0f} ms")
+    print(f"orçamento: {args.orcamento_ms:.0f} ms")
+    print(f"módulos pesados carregados no import: {pesados or 'nenhum'}")
+
+    if args.detalhes:
+        print("\ntop imports (cumulativo, µs):")
+        for cumulativo, modulo in top_imports():
+            print(f"  {cumulativo:>9}  {modulo}")
+
+    if mediana > args.orcamento_ms or pesados:
+        print("FALHOU")
+        sys.exit(1)
+    print("OK")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+# coletor_traces.py
+"""
+Coletor local de spans OTLP/HTTP (JSON), para ver o rastreamento sem subir
+um OpenTelemetry Collector:
+
+    uvicorn coletor_traces:app --port 4318
+    RASTREAMENTO=coletor uvicorn main:app
+
+Cada POST em /v1/traces vira uma linha em COLETOR_ARQUIVO (padrão
+traces_coletor.jsonl), no mesmo formato do RASTREAMENTO=arquivo. Em
+/traces/resumo sai a contagem e a duração p50/p95/máx de cada etapa; o mesmo
+resumo de um arquivo já gravado sai por:
+
+    python coletor_traces.py --resumo traces.jsonl
+"""
+
+import argparse
+import json
+import os
+import threading
+from collections import defaultdict
+from typing import Dict, Iterable, List
+
+from fastapi import FastAPI, Request
+
+ARQUIVO = os.getenv("COLETOR_ARQUIVO", "traces_coletor.jsonl")
+
+app = FastAPI(title="Coletor de traces (FiscalIA Pro)")
+
+_lock = threading.Lock()
+_duracoes: Dict[str, List[float]] = defaultdict(list)
+
+
+def spans_do_lote(lote: dict) -> Iterable[dict]:
+    for recurso in lote.get("resourceSpans", []):
+        for escopo in recurso.get("scopeSpans", []):
+            yield from escopo.get("spans", [])
+
+
+def _duracao_ms(span: dict) -> float:
+    return (int(span["endTimeUnixNano"]) - int(span["startTimeUnixNano"])) / 1e6
+
+
+def _percentil(ordenados: List[float], p: float) -> float:
+    return ordenados[min(len(ordenados) - 1, int(p * len(ordenados)))]
+
+
+def resumir(duracoes: Dict[str, List[float]]) -> List[dict]:
+    """Contagem e latências por nome de span, da etapa mais lenta (p95) para a mais rápida."""
+    etapas = []
+    for nome, valores in duracoes.items():
+        ordenados = sorted(valores)
+        etapas.append(
+            {
+                "span": nome,
+                "qtd": len(ordenados),
+                "p50_ms": round(_percentil(ordenados, 0.50), 1),
+                "p95_ms": round(_percentil(ordenados, 0.95), 1),
+                "max_ms": round(ordenados[-1], 1),
+            }
+        )
+    return sorted(etapas, key=lambda e: e["p95_ms"], reverse=True)
+
+
+@app.post("/v1/traces")
+async def receber(request: Request):
+    lote = await request.json()
+    with _lock:
+        for span in spans_do_lote(lote):
+            _duracoes[span["name"]].append(_duracao_ms(span))
+        with open(ARQUIVO, "a", encoding="utf-8") as f:
+            f.write(json.dumps(lote, ensure_ascii=False) + "\n")
+    # Resposta vazia = ExportTraceServiceResponse sem rejeições
+    return {}
+
+
+@app.get("/traces/resumo")
+async def resumo():
+    with _lock:
+        return {"etapas": resumir(_duracoes)}
+
+
+def resumir_arquivo(caminho: str) -> List[dict]:
+    duracoes: Dict[str, List[float]] = defaultdict(list)
+    with open(caminho, encoding="utf-8") as f:
+        for linha in f:
+            if linha.strip():
+                for span in spans_do_lote(json.loads(linha)):
+                    duracoes[span["name"]].append(_duracao_ms(span))
+    return resumir(duracoes)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Coletor/resumo de traces OTLP/JSON")
+    parser.add_argument("--resumo", metavar="ARQUIVO", help="resume um arquivo JSONL de traces")
+    parser.add_argument("--porta", type=int, default=4318)
+    args = parser.parse_args()
+
+    if args.resumo:
+        for etapa in resumir_arquivo(args.resumo):
+            print(
+                f"{etapa['span']:<45} {etapa['qtd']:>6}  p50 {etapa['p50_ms']:>9.1f} ms"
+                f"  p95 {etapa['p95_ms']:>9.1f} ms  máx {etapa['max_ms']:>9.1f} ms"
+            )
+    else:
+        import uvicorn
+
+        uvicorn.run(app, host="127.0.0.1", port=args.porta)
@@ -0,0 +1,214 @@
+# colunar.py
+"""
+Saída colunar das notas, para BI e análises, ao lado do Excel:
+
+- relatorios/<tenant>/relatorio_nfes_*.parquet (notas) e *_itens.parquet
+  (itens), comprimidos com zstd, para os jobs que carregam o relatório;
+- lotes/<tenant>/<lote_id>/notas.arrow e itens.arrow, no formato de arquivo
+  Arrow IPC sem compressão: lidos com memory map, sem cópia nem parse.
+
+Os tipos são os do registro, sem passar por float: CNPJ, nomes, UF, mês,
+natureza da operação, CFOP e produto como dicionário (categórico), valores
+em centavos int64 e a emissão como timestamp UTC. As notas do lote e os
+itens se ligam pela coluna `nota` (posição da nota no lote): a `chave` da
+NF-e fica vazia quando o XML não tem Id e não serve de ligação.
+
+pyarrow é opcional: sem ele, o lote é processado normalmente, só sem esses
+arquivos (`pyarrow_disponivel()` diz se há saída colunar).
+"""
+
+import importlib.util
+import os
+from typing import TYPE_CHECKING, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from modelos import NotaFiscal
+from rastreamento import rastreado
+
+if TYPE_CHECKING:
+    import pyarrow as pa
+
+COMPRESSAO_PARQUET = os.getenv("PARQUET_COMPRESSAO", "zstd")
+
+# Tabelas gravadas (nome -> sufixo do .parquet do relatório)
+TABELAS = {"notas": "", "itens": "_itens"}
+
+EXTENSAO_ARROW = ".arrow"
+EXTENSAO_PARQUET = ".parquet"
+
+
+def pyarrow_disponivel() -> bool:
+    """pyarrow instalado? Verificado sem importá-lo (ver bench_startup.py)."""
+    return importlib.util.find_spec("pyarrow") is not None
+
+
+def _esquemas() -> Dict[str, "pa.Schema"]:
+    import pyarrow as pa
+
+    categorico = pa.dictionary(pa.int32(), pa.string())
+    return {
+        "notas": pa.schema(
+            [
+                ("nota", pa.int32()),
+                ("chave", pa.string()),
+                ("arquivo", pa.string()),
+                ("cnpj_emit", categorico),
+                ("nome_emit", categorico),
+                ("emitida_em", pa.timestamp("s", tz="UTC")),
+                ("mes", categorico),
+                ("uf", categorico),
+                ("nat_op", categorico),
+                ("total_nf_centavos", pa.int64()),
+                ("icms_centavos", pa.int64()),
+                ("qtd_itens", pa.int32()),
+            ]
+        ),
+        "itens": pa.schema(
+            [
+                ("nota", pa.int32()),
+                ("chave", categorico),
+                ("cnpj_emit", categorico),
+                ("n_item", pa.int32()),
+                ("c_prod", categorico),
+                ("x_prod", categorico),
+                ("cfop", categorico),
+                ("q_com", pa.float64()),
+                ("v_prod_centavos", pa.int64()),
+                ("icms_centavos", pa.int64()),
+            ]
+        ),
+    }
+
+
+@rastreado("colunar.montar_tabelas")
+def montar_tabelas(notas: Sequence[NotaFiscal]) -> Dict[str, "pa.Table"]:
+    """Tabelas Arrow `notas` e `itens` do lote, já com os tipos finais."""
+    import numpy as np
+    import pyarrow as pa
+
+    esquemas = _esquemas()
+    qtd_itens = np.fromiter((len(n.itens) for n in notas), dtype=np.int32, count=len(notas))
+
+    posicoes = np.arange(len(notas), dtype=np.int32)
+    cnpj_emit = _categorico([n.cnpj_emit for n in notas])
+    tabela_notas = pa.Table.from_arrays(
+        [
+            pa.array(posicoes),
+            pa.array([n.chave for n in notas], pa.string()),
+            pa.array([n.arquivo for n in notas], pa.string()),
+            cnpj_emit,
+            _categorico([n.nome_emit for n in notas]),
+            _timestamps([n.data_emissao for n in notas]),
+            _categorico([n.mes for n in notas]),
+            _categorico([n.uf for n in notas]),
+            _categorico([n.nat_op for n in notas]),
+            pa.array(np.fromiter((n.total_nf_centavos for n in notas), np.int64, len(notas))),
+            pa.array(np.fromiter((n.icms_centavos for n in notas), np.int64, len(notas))),
+            pa.array(qtd_itens),
+        ],
+        schema=esquemas["notas"],
+    )
+
+    # Colunas da nota repetidas por item: só os índices do dicionário se repetem
+    por_item = pa.array(np.repeat(posicoes, qtd_itens))
+    itens = [item for nota in notas for item in nota.itens]
+    tabela_itens = pa.Table.from_arrays(
+        [
+            por_item,
+            _categorico([n.chave for n in notas]).take(por_item),
+            cnpj_emit.take(por_item),
+            pa.array(np.fromiter((i.n_item for i in itens), np.int32, len(itens))),
+            _categorico([i.c_prod for i in itens]),
+            _categorico([i.x_prod for i in itens]),
+            _categorico([i.cfop for i in itens]),
+            pa.array(np.fromiter((i.q_com for i in itens), np.float64, len(itens))),
+            pa.array(np.fromiter((i.v_prod_centavos for i in itens), np.int64, len(itens))),
+            pa.array(np.fromiter((i.icms_centavos for i in itens), np.int64, len(itens))),
+        ],
+        schema=esquemas["itens"],
+    )
+    return {"notas": tabela_notas, "itens": tabela_itens}
+
+
+def _categorico(valores: List[str]) -> "pa.DictionaryArray":
+    import pyarrow as pa
+
+    return pa.array(valores, pa.string()).dictionary_encode()
+
+
+def _timestamps(datas: List[str]) -> "pa.Array":
+    """
+    dhEmi (com fuso, layouts 3.10+) ou dEmi (só a data, 1.10/2.00) em UTC.
+    Datas sem hora contam como 00:00 UTC; vazias ou inválidas viram nulo.
+    """
+    import pandas as pd
+    import pyarrow as pa
+
+    convertidas = pd.to_datetime(
+        pd.Series(datas, dtype=object), utc=True, format="ISO8601", errors="coerce"
+    )
+    return pa.Array.from_pandas(convertidas).cast(pa.timestamp("s", tz="UTC"), safe=False)
+
+
+def nomes_parquet(nome_excel: str) -> Dict[str, str]:
+    """Arquivos .parquet que acompanham o relatório Excel `nome_excel`."""
+    base = os.path.splitext(nome_excel)[0]
+    return {tabela: f"{base}{sufixo}{EXTENSAO_PARQUET}" for tabela, sufixo in TABELAS.items()}
+
+
+@rastreado("colunar.gravar_parquet")
+def gravar_parquet(pasta: str, nome_excel: str, tabelas: Dict[str, "pa.Table"]) -> Dict[str, str]:
+    """Grava as tabelas em .parquet ao lado do Excel; retorna tabela -> nome do arquivo."""
+    import pyarrow.parquet as pq
+
+    nomes = nomes_parquet(nome_excel)
+    for tabela, nome in nomes.items():
+        pq.write_table(tabelas[tabela], os.path.join(pasta, nome), compression=COMPRESSAO_PARQUET)
+    return nomes
+
+
+@rastreado("colunar.gravar_arrow")
+def gravar_arrow(pasta: str, tabelas: Dict[str, "pa.Table"]) -> List[str]:
+    """
+    Grava cada tabela em <nome>.arrow (arquivo IPC, sem compressão, para
+    poder ser lido por memory map); retorna os nomes dos arquivos.
+    """
+    import pyarrow as pa
+
+    nomes = []
+    for tabela, dados in tabelas.items():
+        nome = f"{tabela}{EXTENSAO_ARROW}"
+        # Grava em .tmp e renomeia: quem lê nunca vê um arquivo pela metade
+        temporario = os.path.join(pasta, nome + ".tmp")
+        with pa.OSFile(temporario, "wb") as destino:
+            with pa.ipc.new_file(destino, dados.schema) as escritor:
+                escritor.write_table(dados)
+        os.replace(temporario, os.path.join(pasta, nome))
+        nomes.append(nome)
+    return nomes
+
+
+def ler_tabela(caminho: str, colunas: Optional[List[str]] = None) -> "pa.Table":
+    """
+    Lê um .arrow ou .parquet por memory map. No .arrow não há cópia: os
+    buffers da tabela apontam para as páginas do arquivo, carregadas pelo
+    sistema operacional só quando usadas.
+    """
+    import pyarrow as pa
+
+    if caminho.endswith(EXTENSAO_PARQUET):
+        import pyarrow.parquet as pq
+
+        return pq.read_table(caminho, columns=colunas, memory_map=True)
+
+    with pa.memory_map(caminho) as fonte:
+        tabela = pa.ipc.open_file(fonte).read_all()
+    return tabela.select(colunas) if colunas else tabela
+
+
+def totais_por_emitente(tabela: "pa.Table") -> Iterator[Tuple[str, int, int]]:
+    """(nome_emit, total_nf, icms) em centavos, somados na tabela de notas."""
+    somas = tabela.select(["nome_emit", "total_nf_centavos", "icms_centavos"]).group_by(
+        "nome_emit"
+    ).aggregate([("total_nf_centavos", "sum"), ("icms_centavos", "sum")])
+    colunas = somas.to_pydict()
+    return zip(colunas["nome_emit"], colunas["total_nf_centavos_sum"], colunas["icms_centavos_sum"])
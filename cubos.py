@@ -0,0 +1,183 @@
+# cubos.py
+
+import threading
+from itertools import combinations
+from typing import Dict, List, Optional, Tuple
+
+from dinheiro import centavos_para_reais
+from eventos import IndiceEventos, indices_eventos
+from modelos import NotaFiscal
+from tenants import PorTenant
+
+# Dimensões disponíveis para drill-down (na ordem canônica usada nas chaves)
+DIMENSOES = ("cnpj_emit", "mes", "uf", "nat_op")
+
+
+def _novas_medidas() -> dict:
+    # Valores em centavos; convertidos para reais só na saída
+    return {"qtd": 0, "total_nf": 0, "icms": 0}
+
+
+def _em_reais(medidas: dict) -> dict:
+    return {
+        "qtd": medidas["qtd"],
+        "total_nf": centavos_para_reais(medidas["total_nf"]),
+        "icms": centavos_para_reais(medidas["icms"]),
+    }
+
+
+class CuboAgregados:
+    """
+    Agregados materializados das notas processadas.
+
+    Para cada dimensão de agrupamento e cada combinação de filtros sobre as
+    outras dimensões existe um "cuboide" já somado. Cada nota atualiza todas
+    as células correspondentes no momento da ingestão, então uma consulta é
+    apenas um lookup em dicionário, sem varrer as notas.
+
+    Das notas somadas guarda só o necessário para o estorno: os valores das
+    dimensões e os dois valores em centavos (não o registro com os itens).
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._nomes_emit: Dict[str, str] = {}
+        self._total = _novas_medidas()
+        # Notas já somadas, por chave de acesso, para estorno (cancelamento):
+        # chave -> (valores das DIMENSOES, total_nf, icms)
+        self._notas: Dict[str, Tuple[Tuple[str, ...], int, int]] = {}
+        # (dimensao, filtros) -> {valores_dos_filtros: {valor_dimensao: medidas}}
+        self._cuboides: Dict[Tuple[str, Tuple[str, ...]], dict] = {}
+        for dimensao in DIMENSOES:
+            outras = [d for d in DIMENSOES if d != dimensao]
+            for n in range(len(outras) + 1):
+                for filtros in combinations(outras, n):
+                    self._cuboides[(dimensao, filtros)] = {}
+
+    def registrar(self, nota: NotaFiscal) -> bool:
+        """
+        Soma uma nota em todos os cuboides. Notas com chave de acesso já
+        somada (reenvio do mesmo XML) são ignoradas; retorna se somou.
+        """
+        return self.registrar_valores(
+            nota.chave,
+            nota.nome_emit,
+            tuple(getattr(nota, d) for d in DIMENSOES),
+            nota.total_nf_centavos,
+            nota.icms_centavos,
+        )
+
+    def registrar_valores(
+        self, chave: str, nome_emit: str, valores: Tuple[str, ...], total_nf: int, icms: int
+    ) -> bool:
+        """Como `registrar`, a partir dos valores das DIMENSOES e dos centavos."""
+        with self._lock:
+            if chave:
+                if chave in self._notas:
+                    return False
+                self._notas[chave] = (valores, total_nf, icms)
+            if nome_emit:
+                self._nomes_emit[valores[0]] = nome_emit
+            self._aplicar(valores, total_nf, icms, 1)
+            return True
+
+    def registrar_lote(self, notas: List[NotaFiscal]) -> None:
+        for nota in notas:
+            self.registrar(nota)
+
+    def contem(self, chave: str) -> bool:
+        with self._lock:
+            return chave in self._notas
+
+    def remover(self, chave: str) -> bool:
+        """Estorna dos cuboides a nota com essa chave (ex.: cancelada depois)."""
+        with self._lock:
+            registro = self._notas.pop(chave, None)
+            if registro is None:
+                return False
+            self._aplicar(*registro, -1)
+            return True
+
+    def consultar(self, dimensao: str, filtros: Optional[dict] = None) -> List[dict]:
+        """
+        Retorna os totais agrupados por `dimensao`, restritos aos `filtros`
+        (ex.: {"uf": "SP", "mes": "2024-01"}), do maior para o menor total.
+        """
+        if dimensao not in DIMENSOES:
+            raise ValueError(f"Dimensão inválida: {dimensao}")
+        filtros = {k: v for k, v in (filtros or {}).items() if v is not None}
+        for nome in filtros:
+            if nome not in DIMENSOES or nome == dimensao:
+                raise ValueError(f"Filtro inválido para a dimensão {dimensao}: {nome}")
+
+        nomes_filtros = tuple(d for d in DIMENSOES if d in filtros)
+        chave = tuple(filtros[d] for d in nomes_filtros)
+
+        with self._lock:
+            celulas = self._cuboides[(dimensao, nomes_filtros)].get(chave, {})
+            linhas = []
+            for valor, medidas in celulas.items():
+                linha = {dimensao: valor, **_em_reais(medidas)}
+                if dimensao == "cnpj_emit":
+                    linha["nome_emit"] = self._nomes_emit.get(valor, "")
+                linhas.append(linha)
+
+        linhas.sort(key=lambda l: l["total_nf"], reverse=True)
+        return linhas
+
+    def totais(self) -> dict:
+        with self._lock:
+            return _em_reais(self._total)
+
+    def _aplicar(self, valores: Tuple[str, ...], total_nf: int, icms: int, sinal: int) -> None:
+        por_dimensao = dict(zip(DIMENSOES, valores))
+        self._somar(self._total, total_nf, icms, sinal)
+        for (dimensao, filtros), cuboide in self._cuboides.items():
+            chave = tuple(por_dimensao[f] for f in filtros)
+            celulas = cuboide.setdefault(chave, {})
+            medidas = celulas.get(por_dimensao[dimensao])
+            if medidas is None:
+                medidas = celulas[por_dimensao[dimensao]] = _novas_medidas()
+            self._somar(medidas, total_nf, icms, sinal)
+            if medidas["qtd"] == 0:
+                del celulas[por_dimensao[dimensao]]
+
+    @staticmethod
+    def _somar(medidas: dict, total_nf: int, icms: int, sinal: int = 1) -> None:
+        medidas["qtd"] += sinal
+        medidas["total_nf"] += sinal * total_nf
+        medidas["icms"] += sinal * icms
+
+
+def carregar_cubo(tenant: str) -> CuboAgregados:
+    """
+    Cubo do tenant refeito a partir dos lotes salvos em disco (do mais antigo
+    ao mais novo), sem as notas canceladas pelos eventos já recebidos. Assim
+    os agregados sobrevivem a um restart e batem com os lotes.
+    """
+    from lotes import armazem_lotes
+
+    cubo = CuboAgregados()
+    indice = indices_eventos.obter(tenant) or IndiceEventos()
+    for nota in armazem_lotes.notas_salvas(tenant):
+        if indice.cancelada(nota["chave"]):
+            continue
+        cubo.registrar_valores(
+            nota["chave"],
+            nota["nome_emit"],
+            tuple(nota[d] for d in DIMENSOES),
+            nota["total_nf_centavos"],
+            nota["icms_centavos"],
+        )
+    return cubo
+
+
+def tem_lotes(tenant: str) -> bool:
+    from lotes import armazem_lotes
+
+    return armazem_lotes.tem_lotes(tenant)
+
+
+# Um cubo por tenant, carregado dos lotes no primeiro uso e alimentado a cada
+# lote processado; consultas usam `obter` e não criam cubo vazio
+cubos = PorTenant(carregar_cubo, tem_lotes)
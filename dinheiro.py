@@ -0,0 +1,71 @@
+# dinheiro.py
+
+from decimal import ROUND_HALF_UP, Decimal
+from typing import TYPE_CHECKING, Iterable, Optional
+
+if TYPE_CHECKING:
+    import numpy as np
+
+# Valores monetários circulam como centavos inteiros (int64 nos arrays NumPy).
+# Conversão para reais só acontece na borda: JSON, Excel, PDF e prompt da IA.
+# O NumPy é importado só dentro das funções vetorizadas, para não pesar no
+# import do app (quem só atende /health ou /processar-xml nunca o carrega).
+
+
+def para_centavos(valor: str) -> int:
+    """
+    Converte o texto decimal do XML (ex.: "5000.00") em centavos inteiros,
+    sem passar por float.
+    """
+    texto = str(valor).strip()
+    inteiro, _, fracao = texto.partition(".")
+    if len(fracao) <= 2 and inteiro.lstrip("-").isdigit() and (not fracao or fracao.isdigit()):
+        negativo = inteiro.startswith("-")
+        centavos = int(inteiro.lstrip("-") or "0") * 100 + int(fracao.ljust(2, "0"))
+        return -centavos if negativo else centavos
+    # Caminho lento: mais de 2 casas, expoente etc.
+    return int((Decimal(texto) * 100).to_integral_value(rounding=ROUND_HALF_UP))
+
+
+def array_centavos(valores: Iterable[int], quantidade: Optional[int] = None) -> "np.ndarray":
+    """Monta um array int64 de centavos sem lista intermediária."""
+    import numpy as np
+
+    return np.fromiter(valores, dtype=np.int64, count=-1 if quantidade is None else quantidade)
+
+
+def somar_centavos(centavos: "np.ndarray") -> int:
+    """Soma vetorizada e exata (inteira) de um array de centavos."""
+    import numpy as np
+
+    return int(np.sum(centavos, dtype=np.int64))
+
+
+def centavos_para_reais(centavos):
+    """Centavos → reais (float), escalar ou array. Só para exibição/serialização."""
+    return centavos / 100
+
+
+def reais_para_centavos(valores) -> "np.ndarray":
+    """
+    Reais (float, ex.: coluna lida do Excel) → centavos int64.
+    Como os valores têm no máximo 2 casas, o arredondamento recupera o valor exato.
+    """
+    import numpy as np
+
+    return np.rint(np.asarray(valores, dtype=np.float64) * 100).astype(np.int64)
+
+
+def formatar_decimal(centavos: int) -> str:
+    """Centavos → "1234.56", exato."""
+    sinal = "-" if centavos < 0 else ""
+    reais, resto = divmod(abs(int(centavos)), 100)
+    return f"{sinal}{reais}.{resto:02d}"
+
+
+def formatar_reais(centavos: int) -> str:
+    """Centavos → "R$ 1.234,56", exato."""
+    sinal = "-" if centavos < 0 else ""
+    reais, resto = divmod(abs(int(centavos)), 100)
+    milhar = f"{reais:,}".replace(",", ".")
+    return f"{sinal}R$ {milhar},{resto:02d}"
@@ -0,0 +1,167 @@
+# estaticos.py
+
+import gzip
+import hashlib
+import mimetypes
+import os
+import re
+from dataclasses import dataclass
+from typing import Dict, Optional
+
+from starlette.datastructures import Headers
+from starlette.middleware.gzip import GZipMiddleware
+from starlette.requests import Request
+from starlette.responses import Response
+
+try:  # brotli é opcional: sem ele servimos só gzip/identidade
+    import brotli
+except ImportError:  # pragma: no cover - depende do ambiente
+    brotli = None
+
+# Tipos que já vêm comprimidos não ganham nada com gzip/brotli
+TIPOS_SEM_COMPRESSAO = ("image/png", "image/jpeg", "image/gif", "image/webp")
+
+CACHE_IMUTAVEL = "public, max-age=31536000, immutable"
+CACHE_REVALIDAR = "no-cache"
+CACHE_ASSETS = "public, max-age=86400"
+
+# Placeholders no index.html: {{app.css}} → /static/<versao>/app.css
+PLACEHOLDER = re.compile(r"\{\{([\w.\-]+)\}\}")
+
+mimetypes.add_type("image/x-icon", ".ico")
+
+
+@dataclass(slots=True)
+class ArquivoEstatico:
+    nome: str
+    media_type: str
+    conteudo: bytes
+    etag: str
+    versao: str
+    gzip: Optional[bytes] = None
+    br: Optional[bytes] = None
+
+
+def _carregar(nome: str, conteudo: bytes) -> ArquivoEstatico:
+    media_type = mimetypes.guess_type(nome)[0] or "application/octet-stream"
+    if media_type.startswith("text/") or media_type == "application/javascript":
+        media_type += "; charset=utf-8"
+
+    digest = hashlib.sha256(conteudo).hexdigest()
+    arquivo = ArquivoEstatico(
+        nome=nome,
+        media_type=media_type,
+        conteudo=conteudo,
+        etag=f'"{digest[:32]}"',
+        versao=digest[:12],
+    )
+
+    if not media_type.startswith(TIPOS_SEM_COMPRESSAO) and len(conteudo) >= 256:
+        # Variantes pré-computadas uma vez, no nível máximo de compressão
+        arquivo.gzip = gzip.compress(conteudo, compresslevel=9, mtime=0)
+        if brotli is not None:
+            arquivo.br = brotli.compress(conteudo, quality=11)
+    return arquivo
+
+
+def codificacoes_aceitas(cabecalho: str) -> Dict[str, float]:
+    """
+    Accept-Encoding -> {codificação: q}. "br;q=0" recusa brotli, e uma
+    codificação não listada vale o q de "*" (ou 0 sem "*").
+    """
+    aceitas = {}
+    for item in cabecalho.split(","):
+        nome, _, parametros = item.partition(";")
+        nome = nome.strip().lower()
+        if not nome:
+            continue
+        q = 1.0
+        for parametro in parametros.split(";"):
+            chave, _, valor = parametro.partition("=")
+            if chave.strip().lower() == "q":
+                try:
+                    q = float(valor)
+                except ValueError:
+                    q = 0.0
+        aceitas[nome] = q
+    return aceitas
+
+
+def aceita(aceitas: Dict[str, float], codificacao: str) -> bool:
+    return aceitas.get(codificacao, aceitas.get("*", 0.0)) > 0
+
+
+class GZipNegociado(GZipMiddleware):
+    """
+    GZipMiddleware que respeita o q do Accept-Encoding: o do Starlette só
+    procura "gzip" no texto, então "gzip;q=0" ainda recebia gzip.
+    """
+
+    async def __call__(self, scope, receive, send) -> None:
+        if scope["type"] == "http":
+            cabecalho = Headers(scope=scope).get("accept-encoding", "")
+            if not aceita(codificacoes_aceitas(cabecalho), "gzip"):
+                await self.app(scope, receive, send)
+                return
+        await super().__call__(scope, receive, send)
+
+
+class CatalogoEstatico:
+    """
+    Arquivos do frontend e de assets/ carregados em memória no startup,
+    com ETag, versão (hash do conteúdo) e variantes gzip/brotli prontas.
+    """
+
+    def __init__(self, *diretorios: str, pagina_inicial: str = "index.html"):
+        self.arquivos: Dict[str, ArquivoEstatico] = {}
+        paginas: Dict[str, bytes] = {}
+
+        for diretorio in diretorios:
+            for nome in sorted(os.listdir(diretorio)):
+                caminho = os.path.join(diretorio, nome)
+                if not os.path.isfile(caminho):
+                    continue
+                with open(caminho, "rb") as f:
+                    conteudo = f.read()
+                if nome == pagina_inicial:
+                    paginas[nome] = conteudo
+                else:
+                    self.arquivos[nome] = _carregar(nome, conteudo)
+
+        # A página inicial referencia as versões atuais dos outros arquivos,
+        # por isso é montada depois deles
+        self.pagina_inicial = None
+        if pagina_inicial in paginas:
+            html = PLACEHOLDER.sub(
+                lambda m: self.url(m.group(1)), paginas[pagina_inicial].decode("utf-8")
+            )
+            self.pagina_inicial = _carregar(pagina_inicial, html.encode("utf-8"))
+
+    def url(self, nome: str) -> str:
+        """URL versionada (cacheável para sempre) de um arquivo do catálogo."""
+        return f"/static/{self.arquivos[nome].versao}/{nome}"
+
+    def responder(
+        self, request: Request, arquivo: ArquivoEstatico, cache_control: str
+    ) -> Response:
+        headers = {
+            "ETag": arquivo.etag,
+            "Cache-Control": cache_control,
+            "Vary": "Accept-Encoding",
+        }
+
+        if_none_match = request.headers.get("if-none-match", "")
+        if arquivo.etag in [t.strip().removeprefix("W/") for t in if_none_match.split(",")]:
+            return Response(status_code=304, headers=headers)
+
+        corpo = arquivo.conteudo
+        aceitas = codificacoes_aceitas(request.headers.get("accept-encoding", ""))
+        melhor_q = 0.0
+        for codificacao, variante in (("br", arquivo.br), ("gzip", arquivo.gzip)):
+            q = aceitas.get(codificacao, aceitas.get("*", 0.0))
+            # Maior q vence; no empate fica o brotli, que comprime mais
+            if variante is not None and q > melhor_q:
+                corpo, melhor_q = variante, q
+                headers["Content-Encoding"] = codificacao
+
+        return Response(content=corpo, media_type=arquivo.media_type, headers=headers)
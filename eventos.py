@@ -0,0 +1,178 @@
+# eventos.py
+
+import json
+import os
+import threading
+from dataclasses import asdict, dataclass
+from typing import Dict, List, Optional, Tuple
+
+from tenants import PorTenant
+
+# Tipos de evento da NF-e (tpEvento)
+TP_EVENTO_CANCELAMENTO = "110111"
+TP_EVENTO_CANCELAMENTO_SUBSTITUICAO = "110112"
+TP_EVENTO_CARTA_CORRECAO = "110110"
+
+TIPOS_CANCELAMENTO = {TP_EVENTO_CANCELAMENTO, TP_EVENTO_CANCELAMENTO_SUBSTITUICAO}
+
+# cStat do retEvento que indicam evento registrado/vinculado na SEFAZ
+CSTAT_EVENTO_REGISTRADO = {"135", "136", "155"}
+
+STATUS_AUTORIZADA = "autorizada"
+STATUS_CANCELADA = "cancelada"
+
+RAIZES_EVENTO = ("procEventoNFe", "evento")
+
+# Eventos recebidos ficam em eventos/<tenant>/eventos.ndjson (um por linha)
+DIRETORIO_EVENTOS = os.getenv("DIRETORIO_EVENTOS", "eventos")
+ARQUIVO_EVENTOS = "eventos.ndjson"
+
+
+@dataclass(slots=True)
+class EventoNFe:
+    ch_nfe: str
+    tp_evento: str
+    n_seq_evento: int
+    dh_evento: str
+    registrado: bool
+    descricao: str = ""
+
+    @property
+    def cancelamento(self) -> bool:
+        return self.tp_evento in TIPOS_CANCELAMENTO
+
+
+def eh_evento(data: dict) -> bool:
+    """Indica se o XML parseado é um evento (procEventoNFe ou evento avulso)."""
+    return any(raiz in data for raiz in RAIZES_EVENTO)
+
+
+def extrair_evento(data: dict) -> EventoNFe:
+    """
+    Aceita tanto:
+    - procEventoNFe -> evento/retEvento
+    - evento (sem retorno da SEFAZ, considerado não registrado)
+    """
+    if "procEventoNFe" in data:
+        proc = data["procEventoNFe"]
+        evento = proc["evento"]
+        ret = (proc.get("retEvento") or {}).get("infEvento") or {}
+        registrado = ret.get("cStat") in CSTAT_EVENTO_REGISTRADO
+    elif "evento" in data:
+        evento = data["evento"]
+        registrado = False
+    else:
+        raise KeyError("Estrutura de evento de NF-e não reconhecida")
+
+    inf = evento["infEvento"]
+    return EventoNFe(
+        ch_nfe=inf["chNFe"],
+        tp_evento=inf["tpEvento"],
+        n_seq_evento=int(inf.get("nSeqEvento") or 1),
+        dh_evento=inf.get("dhEvento", ""),
+        registrado=registrado,
+        descricao=(inf.get("detEvento") or {}).get("descEvento", ""),
+    )
+
+
+class IndiceEventos:
+    """
+    Índice de eventos por chave de acesso (chNFe).
+
+    Guarda só as chaves que têm evento; qualquer outra chave é autorizada.
+    A consulta de status é um lookup O(1) usado durante a agregação.
+
+    Com `caminho`, cada evento novo é acrescentado ao arquivo NDJSON e o
+    índice é recarregado dele, então os cancelamentos sobrevivem a um restart.
+    `cancelamentos` conta as notas canceladas até agora: quando muda, quem
+    guardou totais (ver lotes.py) sabe que precisa conferi-los de novo.
+    """
+
+    def __init__(self, caminho: Optional[str] = None):
+        self._lock = threading.Lock()
+        self._status: Dict[str, str] = {}
+        self._eventos: Dict[str, List[EventoNFe]] = {}
+        self.cancelamentos = 0
+        self.caminho = caminho
+        if caminho and os.path.exists(caminho):
+            with open(caminho, encoding="utf-8") as f:
+                for linha in f:
+                    if linha.strip():
+                        self._indexar(EventoNFe(**json.loads(linha)))
+
+    def registrar(self, evento: EventoNFe) -> bool:
+        """
+        Indexa o evento. Retorna True se ele acabou de cancelar a nota,
+        para quem mantém totais poder estornar a nota já somada.
+        """
+        with self._lock:
+            novo, cancelou = self._indexar(evento)
+            if novo and self.caminho:
+                os.makedirs(os.path.dirname(self.caminho), exist_ok=True)
+                with open(self.caminho, "a", encoding="utf-8") as f:
+                    f.write(json.dumps(asdict(evento), ensure_ascii=False) + "\n")
+            return cancelou
+
+    def _indexar(self, evento: EventoNFe) -> Tuple[bool, bool]:
+        """(evento novo?, cancelou a nota agora?)"""
+        eventos = self._eventos.setdefault(evento.ch_nfe, [])
+        if any(
+            e.tp_evento == evento.tp_evento and e.n_seq_evento == evento.n_seq_evento
+            for e in eventos
+        ):
+            return False, False
+        eventos.append(evento)
+
+        if not (evento.registrado and evento.cancelamento):
+            return True, False
+        if self._status.get(evento.ch_nfe) == STATUS_CANCELADA:
+            return True, False
+        self._status[evento.ch_nfe] = STATUS_CANCELADA
+        self.cancelamentos += 1
+        return True, True
+
+    def status(self, chave: str) -> str:
+        return self._status.get(chave, STATUS_AUTORIZADA)
+
+    def cancelada(self, chave: str) -> bool:
+        return bool(chave) and self._status.get(chave) == STATUS_CANCELADA
+
+    def eventos(self, chave: str) -> List[EventoNFe]:
+        with self._lock:
+            return list(self._eventos.get(chave, []))
+
+
+def chave_da_nfe(inf_nfe: dict, data: Optional[dict] = None) -> str:
+    """
+    Chave de acesso (44 dígitos) da nota: atributo Id do infNFe sem o prefixo
+    "NFe", ou protNFe/infProt/chNFe quando o XML é um nfeProc.
+    Retorna "" se a nota não tem uma chave válida (não pode ser conciliada).
+    """
+    chave = inf_nfe.get("@Id", "")
+    if chave.startswith("NFe"):
+        chave = chave[3:]
+    if not _chave_valida(chave) and data and "nfeProc" in data:
+        prot = (data["nfeProc"].get("protNFe") or {}).get("infProt") or {}
+        chave = prot.get("chNFe", "")
+    return chave if _chave_valida(chave) else ""
+
+
+def _chave_valida(chave: str) -> bool:
+    return len(chave) == 44 and chave.isdigit()
+
+
+def _caminho_indice(tenant: str) -> str:
+    return os.path.join(DIRETORIO_EVENTOS, tenant, ARQUIVO_EVENTOS)
+
+
+def carregar_indice(tenant: str) -> IndiceEventos:
+    return IndiceEventos(_caminho_indice(tenant))
+
+
+def tem_eventos(tenant: str) -> bool:
+    return os.path.exists(_caminho_indice(tenant))
+
+
+# Um índice por tenant, recarregado do disco no primeiro uso e alimentado a
+# cada lote processado; consultas usam `obter` e não criam índice vazio
+indices_eventos = PorTenant(carregar_indice, tem_eventos)
@@ -0,0 +1,156 @@
+let selectedFiles = [];
+
+const uploadArea = document.getElementById('upload-area');
+const fileInput = document.getElementById('file-input');
+const fileList = document.getElementById('file-list');
+const btnProcessar = document.getElementById('btn-processar');
+
+uploadArea.addEventListener('dragover', (e) => {
+  e.preventDefault();
+  uploadArea.classList.add('dragover');
+});
+
+uploadArea.addEventListener('dragleave', () => {
+  uploadArea.classList.remove('dragover');
+});
+
+uploadArea.addEventListener('drop', (e) => {
+  e.preventDefault();
+  uploadArea.classList.remove('dragover');
+  const files = Array.from(e.dataTransfer.files);
+  handleFiles(files);
+});
+
+fileInput.addEventListener('change', (e) => {
+  const files = Array.from(e.target.files);
+  handleFiles(files);
+});
+
+function handleFiles(files) {
+  selectedFiles = files.filter(f => f.name.endsWith('.xml'));
+
+  if (selectedFiles.length === 0) {
+    alert('Por favor, selecione apenas arquivos XML.');
+    return;
+  }
+
+  renderFileList();
+  btnProcessar.disabled = false;
+}
+
+function renderFileList() {
+  if (selectedFiles.length === 0) {
+    fileList.classList.add('hidden');
+    btnProcessar.disabled = true;
+    return;
+  }
+
+  fileList.classList.remove('hidden');
+  fileList.innerHTML = selectedFiles.map((file, index) => `
+    <div class="file-item">
+      <span class="file-name">📄 ${file.name}</span>
+      <span class="file-size">${(file.size / 1024).toFixed(1)} KB</span>
+      <button type="button" class="remove-file" onclick="removeFile(${index})">Remover</button>
+    </div>
+  `).join('');
+}
+
+function removeFile(index) {
+  selectedFiles.splice(index, 1);
+  renderFileList();
+}
+
+async function enviar() {
+  const form = document.getElementById('form-nfes');
+  const formData = new FormData();
+
+  selectedFiles.forEach(file => {
+    formData.append('files', file);
+  });
+
+  document.getElementById('loading').classList.add('active');
+  document.getElementById('resultado').classList.add('hidden');
+  document.getElementById('resumo-ia').classList.add('hidden');
+  btnProcessar.disabled = true;
+
+  try {
+    const resp = await fetch('/processar-nfes', {
+      method: 'POST',
+      body: formData
+    });
+
+    const data = await resp.json();
+
+    if (resp.ok) {
+      mostrarResultado(data);
+    } else {
+      alert('Erro: ' + (data.detail || 'erro ao processar'));
+    }
+  } catch (error) {
+    alert('Erro de conexão: ' + error.message);
+  } finally {
+    document.getElementById('loading').classList.remove('active');
+    btnProcessar.disabled = false;
+  }
+}
+
+function mostrarResultado(data) {
+  const div = document.getElementById('resultado');
+  div.classList.remove('hidden');
+
+  div.innerHTML = `
+    <div class="resultado-card">
+      <h2 class="resultado-title">Resultado</h2>
+
+      <div class="stats-grid">
+        <div class="stat-item">
+          <div class="stat-label">Notas Processadas</div>
+          <div class="stat-value">${data.qtd}</div>
+        </div>
+        <div class="stat-item">
+          <div class="stat-label">Total Geral</div>
+          <div class="stat-value">R$ ${data.total_geral.toFixed(2)}</div>
+        </div>
+        <div class="stat-item">
+          <div class="stat-label">Total ICMS</div>
+          <div class="stat-value">R$ ${data.total_icms.toFixed(2)}</div>
+        </div>
+      </div>
+
+      <div class="action-buttons">
+        <a href="/download-relatorio?nome_arquivo=${encodeURIComponent(data.relatorio_excel)}" class="btn-download">
+          Baixar Excel
+        </a>
+        <button type="button" class="btn btn-secondary" onclick="gerarResumoIA('${data.lote_id}')">
+          Gerar Resumo IA
+        </button>
+      </div>
+    </div>
+  `;
+}
+
+async function gerarResumoIA(loteId) {
+  document.getElementById('loading').classList.add('active');
+
+  try {
+    const resp = await fetch('/resumo-ia?lote_id=' + encodeURIComponent(loteId));
+    const data = await resp.json();
+
+    if (resp.ok) {
+      const resumoDiv = document.getElementById('resumo-ia');
+      resumoDiv.classList.remove('hidden');
+      resumoDiv.innerHTML = `
+        <div class="resumo-ia-card">
+          <h3>Análise IA</h3>
+          <pre>${data.resumo}</pre>
+        </div>
+      `;
+    } else {
+      alert('Erro IA: ' + (data.detail || 'erro ao gerar resumo'));
+    }
+  } catch (error) {
+    alert('Erro ao gerar resumo: ' + error.message);
+  } finally {
+    document.getElementById('loading').classList.remove('active');
+  }
+}
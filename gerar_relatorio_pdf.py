@@ -4,7 +4,11 @@ import pandas as pd   # Importa o pandas para ler o Excel com os dados das NFs
 from reportlab.lib.pagesizes import A4  # tamanho da página A4 [web:586]
 from reportlab.pdfgen import canvas    # "tela" onde vamos desenhar o PDF [web:584]
 
+from dinheiro import formatar_reais, reais_para_centavos
+from rastreamento import rastreado, span
 
+
+@rastreado("relatorio_pdf")
 def gerar_relatorio_pdf(caminho_excel: str) -> str:
     """
     Gera um PDF simples a partir de um arquivo Excel já existente
@@ -13,7 +17,8 @@ def gerar_relatorio_pdf(caminho_excel: str) -> str:
 
     # Lê o Excel com os dados das notas
     # Aqui supõe que seu Excel já tem colunas como 'emitente', 'total_nf' e 'icms'
-    df = pd.read_excel(caminho_excel)
+    with span("relatorio_pdf.ler_excel"):
+        df = pd.read_excel(caminho_excel, sheet_name="Relatorio")
 
     # Define o nome do PDF com base no nome do Excel
     caminho_pdf = caminho_excel.replace(".xlsx", ".pdf")
@@ -45,10 +50,16 @@ def gerar_relatorio_pdf(caminho_excel: str) -> str:
 
     # Itera nas primeiras linhas do DataFrame para não lotar a página
     # Ajuste o .head(30) conforme a quantidade típica de dados.
-    for _, row in df.head(30).iterrows():
+    linhas = df.head(30)
+
+    # Valores convertidos para centavos inteiros e formatados sem float (R$ 1.234,56)
+    total_centavos = reais_para_centavos(linhas["total_nf"].fillna(0))
+    icms_centavos = reais_para_centavos(linhas["icms"].fillna(0))
+
+    for i, (_, row) in enumerate(linhas.iterrows()):
         emitente = str(row.get("emitente", ""))[:25]  # corta para não extrapolar
-        total_nf = str(row.get("total_nf", ""))
-        icms = str(row.get("icms", ""))
+        total_nf = formatar_reais(total_centavos[i])
+        icms = formatar_reais(icms_centavos[i])
 
         c.drawString(50, y, emitente)
         c.drawString(250, y, total_nf)
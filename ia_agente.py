@@ -1,34 +1,65 @@
 # ia_agente.py
 
-import os
-import pandas as pd
-from groq import Groq  # SDK oficial da Groq [web:500][web:507]
-from dotenv import load_dotenv
+import itertools
+from typing import TYPE_CHECKING, Iterable, Iterator, List, Tuple
 
-load_dotenv()  # Carrega as variáveis de ambiente do arquivo .env
+from dinheiro import formatar_decimal, reais_para_centavos
+from llm import cache_respostas, obter_backend
+from rastreamento import span
 
+if TYPE_CHECKING:
+    import pandas as pd
 
-GROQ_API_KEY = os.getenv("GROQ_API_KEY")
+TEMPERATURA = 0.3
 
-# Cliente Groq global
-groq_client = Groq(api_key=GROQ_API_KEY)
 
-
-def gerar_resumo_nf(df: pd.DataFrame) -> str:
+def montar_mensagens(df: "pd.DataFrame") -> List[dict]:
     """
     Recebe o DataFrame de notas (como o que vai para o Excel)
-    e gera um resumo em texto usando Groq (sem Agno por enquanto).
+    e monta o prompt do resumo, somado por emitente.
     """
+    import pandas as pd
+
     df_sem_total = df[df["arquivo"] != "TOTAL"]
 
-    resumo_por_emit = (
-        df_sem_total
-        .groupby("nome_emit")[["total_nf", "icms"]]
-        .sum()
-        .reset_index()
+    # Soma em centavos int64 para o texto do prompt bater com o Excel
+    centavos = pd.DataFrame(
+        {
+            "nome_emit": df_sem_total["nome_emit"].to_numpy(),
+            "total_nf": reais_para_centavos(df_sem_total["total_nf"]),
+            "icms": reais_para_centavos(df_sem_total["icms"]),
+        }
     )
+    resumo_por_emit = centavos.groupby("nome_emit")[["total_nf", "icms"]].sum()
+    return montar_mensagens_de_agregados(
+        (nome, int(linha.total_nf), int(linha.icms)) for nome, linha in resumo_por_emit.iterrows()
+    )
+
 
-    contexto = resumo_por_emit.to_string(index=False)
+def montar_mensagens_de_agregados(por_emitente: Iterable[Tuple[str, int, int]]) -> List[dict]:
+    """
+    Mesmo prompt de `montar_mensagens`, a partir de (nome_emit, total_nf, icms)
+    em centavos, como os totais das partições de um lote. Não precisa de pandas
+    nem de reler as notas. Emitentes com o mesmo nome são somados.
+    """
+    somas = {}
+    for nome, total_nf, icms in por_emitente:
+        anterior = somas.get(nome, (0, 0))
+        somas[nome] = (anterior[0] + total_nf, anterior[1] + icms)
+
+    linhas = [("nome_emit", "total_nf", "icms")] + [
+        (nome, formatar_decimal(total_nf), formatar_decimal(icms))
+        for nome, (total_nf, icms) in sorted(somas.items())
+    ]
+    larguras = [max(len(linha[i]) for linha in linhas) for i in range(3)]
+    contexto = "\n".join(
+        f"{nome:<{larguras[0]}}  {total_nf:>{larguras[1]}}  {icms:>{larguras[2]}}"
+        for nome, total_nf, icms in linhas
+    )
+
+    # Inteiros do Python: soma exata, sem numpy
+    total_geral = formatar_decimal(sum(t for t, _ in somas.values()))
+    total_icms = formatar_decimal(sum(i for _, i in somas.values()))
 
     prompt = f"""
     Você recebeu uma tabela com colunas: nome_emit, total_nf, icms.
@@ -38,6 +69,8 @@ def gerar_resumo_nf(df: pd.DataFrame) -> str:
     DADOS:
     {contexto}
 
+    TOTAL GERAL: {total_geral} (ICMS: {total_icms})
+
     Gere um resumo curto, em português, abordando:
     - Faturamento total aproximado.
     - Quem são os principais emissores (maiores valores).
@@ -46,19 +79,64 @@ def gerar_resumo_nf(df: pd.DataFrame) -> str:
     Não devolva tabela nem código, apenas um texto corrido em 1 a 3 parágrafos.
     """
 
-    chat_completion = groq_client.chat.completions.create(
-        model="llama-3.3-70b-versatile",  # modelo da Groq [web:502][web:504]
-        messages=[
-            {
-                "role": "system",
-                "content": "Você é um contador sênior que explica resultados de NF-e em português simples.",
-            },
-            {
-                "role": "user",
-                "content": prompt,
-            },
-        ],
-        temperature=0.3,
+    return [
+        {
+            "role": "system",
+            "content": "Você é um contador sênior que explica resultados de NF-e em português simples.",
+        },
+        {
+            "role": "user",
+            "content": prompt,
+        },
+    ]
+
+
+def gerar_resumo(mensagens: List[dict]) -> str:
+    """
+    Gera o resumo em texto pelo backend de LLM configurado (Groq por padrão).
+    O mesmo prompt (mesmos dados) é respondido do cache, sem nova chamada.
+    """
+    return cache_respostas.obter_ou_gerar(
+        cache_respostas.chave(mensagens, TEMPERATURA),
+        lambda: _completar(mensagens),
+    )
+
+
+def _completar(mensagens: List[dict]) -> str:
+    backend = obter_backend()
+    with span("llm.completar", backend=type(backend).__name__):
+        return backend.completar(mensagens, TEMPERATURA)
+
+
+def gerar_resumo_stream(mensagens: List[dict]) -> Iterator[str]:
+    """
+    Igual a `gerar_resumo`, mas devolve o texto em pedaços à medida que chega.
+    O primeiro pedaço já vem lido: erros do provedor (429, falha de conexão)
+    saem daqui, antes de a resposta HTTP começar. Passa pelo mesmo cache, com
+    uma única chamada ao backend por prompt.
+    """
+    partes = cache_respostas.obter_ou_transmitir(
+        cache_respostas.chave(mensagens, TEMPERATURA),
+        lambda: obter_backend().completar_stream(mensagens, TEMPERATURA),
     )
+    primeira = next(partes, None)
+    if primeira is None:
+        return iter(())
+    return itertools.chain([primeira], partes)
 
-    return chat_completion.choices[0].message.content.strip()
+
+def gerar_resumo_nf(df: "pd.DataFrame") -> str:
+    return gerar_resumo(montar_mensagens(df))
+
+
+def gerar_resumo_nf_stream(df: "pd.DataFrame") -> Iterator[str]:
+    return gerar_resumo_stream(montar_mensagens(df))
+
+
+def mensagens_do_lote(particoes: List[dict]) -> List[dict]:
+    """Prompt do resumo a partir das partições (uma por CNPJ) de um lote salvo."""
+    return montar_mensagens_de_agregados(
+        (p["nome_emit"], p["total_nf_centavos"], p["icms_centavos"])
+        for p in particoes
+        if p["qtd"] > 0  # emitente com todas as notas canceladas depois
+    )
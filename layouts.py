@@ -0,0 +1,192 @@
+# layouts.py
+
+from typing import Callable, Dict, List, Optional, Tuple
+
+# Código IBGE da UF (ide/cUF) -> sigla, usado quando não há enderEmit/UF
+UF_POR_CODIGO = {
+    "11": "RO", "12": "AC", "13": "AM", "14": "RR", "15": "PA", "16": "AP",
+    "17": "TO", "21": "MA", "22": "PI", "23": "CE", "24": "RN", "25": "PB",
+    "26": "PE", "27": "AL", "28": "SE", "29": "BA", "31": "MG", "32": "ES",
+    "33": "RJ", "35": "SP", "41": "PR", "42": "SC", "43": "RS", "50": "MS",
+    "51": "MT", "52": "GO", "53": "DF",
+}
+
+MODELO_NFE = "55"
+MODELO_NFCE = "65"
+
+# Caminhos dentro do infNFe. Cada campo aceita uma ou mais alternativas;
+# vale a primeira que existir (ex.: emitente com CNPJ ou CPF).
+_CAMPOS_COMUNS = {
+    "cnpj_emit": (("emit", "CNPJ"), ("emit", "CPF")),
+    "nome_emit": (("emit", "xNome"),),
+    "uf_emit": (("emit", "enderEmit", "UF"),),
+    "c_uf": (("ide", "cUF"),),
+    "nat_op": (("ide", "natOp"),),
+    "modelo": (("ide", "mod"),),
+    "v_nf": (("total", "ICMSTot", "vNF"),),
+    "v_icms": (("total", "ICMSTot", "vICMS"),),
+}
+
+# Até o layout 2.00 a emissão é só data (dEmi); a partir do 3.10, data/hora (dhEmi)
+_CAMPOS_V1 = {**_CAMPOS_COMUNS, "data_emissao": (("ide", "dEmi"), ("ide", "dhEmi"))}
+_CAMPOS_V3 = {**_CAMPOS_COMUNS, "data_emissao": (("ide", "dhEmi"), ("ide", "dEmi"))}
+
+# (modelo, versão do layout) -> mapa de campos. NFC-e (65) só existe a partir do 3.10.
+MAPAS_DE_CAMPOS = {
+    (MODELO_NFE, "1.10"): _CAMPOS_V1,
+    (MODELO_NFE, "2.00"): _CAMPOS_V1,
+    (MODELO_NFE, "3.10"): _CAMPOS_V3,
+    (MODELO_NFE, "4.00"): _CAMPOS_V3,
+    (MODELO_NFCE, "3.10"): _CAMPOS_V3,
+    (MODELO_NFCE, "4.00"): _CAMPOS_V3,
+}
+
+# Campos de cada item (det), iguais em todos os layouts acima. O vICMS fica
+# dentro do grupo do CST/CSOSN (ICMS00, ICMS20, ICMSSN102...): ver _icms_item
+_CAMPOS_ITEM = {
+    "c_prod": (("prod", "cProd"),),
+    "x_prod": (("prod", "xProd"),),
+    "cfop": (("prod", "CFOP"),),
+    "q_com": (("prod", "qCom"),),
+    "v_prod": (("prod", "vProd"),),
+}
+
+# Raiz do XML -> caminho até o infNFe
+_CAMINHOS_RAIZ = {
+    "nfeProc": ("nfeProc", "NFe", "infNFe"),
+    "NFe": ("NFe", "infNFe"),
+}
+
+
+class LayoutNaoSuportado(ValueError):
+    """Modelo/versão da nota sem mapa de campos (a nota é recusada, vira 422 na API)."""
+
+
+def _compilar_caminho(alternativas: Tuple[Tuple[str, ...], ...]) -> Callable[[dict], str]:
+    """Gera um leitor fixo para o campo (sem laço sobre o mapa na hora da extração)."""
+
+    def ler(no: dict) -> str:
+        for caminho in alternativas:
+            valor = no
+            for chave in caminho:
+                if not isinstance(valor, dict):
+                    valor = None
+                    break
+                valor = valor.get(chave)
+            if isinstance(valor, dict):
+                # Elemento com atributos: o xmltodict devolve {"@attr": ..., "#text": ...}
+                valor = valor.get("#text")
+            if valor is not None:
+                return valor
+        return ""
+
+    return ler
+
+
+def _compilar(mapa: dict) -> Tuple[Tuple[str, Callable[[dict], str]], ...]:
+    return tuple((campo, _compilar_caminho(caminhos)) for campo, caminhos in mapa.items())
+
+
+# Leitores já compilados, por layout
+_LEITORES = {layout: _compilar(mapa) for layout, mapa in MAPAS_DE_CAMPOS.items()}
+_LEITORES_ITEM = _compilar(_CAMPOS_ITEM)
+_LER_MODELO = _compilar_caminho(_CAMPOS_COMUNS["modelo"])
+
+
+def localizar_inf_nfe(data: dict) -> dict:
+    """
+    Aceita tanto:
+    - nfeProc -> NFe -> infNFe
+    - NFe -> infNFe
+    (e as mesmas raízes com prefixo de namespace). Retorna o dict de infNFe.
+    """
+    for raiz, caminho in _CAMINHOS_RAIZ.items():
+        if raiz in data:
+            no = data
+            for chave in caminho:
+                no = no[chave]
+            return no
+    for k in data.keys():
+        if k.endswith("nfeProc"):
+            return _filho(_filho(data[k], "NFe"), "infNFe")
+        if k.endswith("NFe"):
+            return _filho(data[k], "infNFe")
+    raise KeyError("Estrutura de NF-e não reconhecida")
+
+
+def _filho(no: dict, nome: str) -> dict:
+    if nome in no:
+        return no[nome]
+    for k in no.keys():
+        if k.endswith(":" + nome):
+            return no[k]
+    raise KeyError(f"Estrutura de NF-e não reconhecida: sem {nome}")
+
+
+def detectar_layout(inf_nfe: dict) -> Tuple[str, str]:
+    """
+    (modelo, versão) do infNFe, a partir do atributo versao e de ide/mod.
+    Uma revisão sem mapa próprio (ex.: "4.01") é lida pelo layout conhecido
+    mais próximo abaixo dela na mesma versão principal, com aviso no log;
+    modelo ou versão principal desconhecidos geram LayoutNaoSuportado.
+    """
+    versao = inf_nfe.get("@versao")
+    modelo = _LER_MODELO(inf_nfe)
+    if not versao or not modelo:
+        raise LayoutNaoSuportado("infNFe sem atributo versao ou sem ide/mod")
+    if (modelo, versao) in _LEITORES:
+        return modelo, versao
+    principal = versao.split(".")[0]
+    conhecidas = sorted(
+        (
+            v
+            for m, v in _LEITORES
+            if m == modelo and v.split(".")[0] == principal and _num(v) <= _num(versao)
+        ),
+        key=_num,
+    )
+    if not conhecidas:
+        print(f"LAYOUT NÃO SUPORTADO: modelo {modelo}, versão {versao}")
+        raise LayoutNaoSuportado(f"Layout não suportado: modelo {modelo}, versão {versao}")
+    print(f"LAYOUT {modelo}/{versao} SEM MAPA PRÓPRIO: lido como {modelo}/{conhecidas[-1]}")
+    return modelo, conhecidas[-1]
+
+
+def _num(versao: str) -> float:
+    try:
+        return float(versao)
+    except ValueError:
+        return 0.0
+
+
+def extrair_campos(inf_nfe: dict, layout: Optional[Tuple[str, str]] = None) -> Dict[str, str]:
+    """Lê todos os campos do layout em uma passada pela tabela de leitores."""
+    leitores = _LEITORES[layout or detectar_layout(inf_nfe)]
+    return {campo: ler(inf_nfe) for campo, ler in leitores}
+
+
+def _icms_item(det: dict) -> str:
+    icms = (det.get("imposto") or {}).get("ICMS") or {}
+    if not isinstance(icms, dict):
+        return ""
+    if "vICMS" in icms:
+        return icms["vICMS"]
+    for grupo in icms.values():
+        if isinstance(grupo, dict) and grupo.get("vICMS"):
+            return grupo["vICMS"]
+    return ""
+
+
+def extrair_itens(inf_nfe: dict) -> List[Dict[str, str]]:
+    """Campos de cada det do infNFe (um dict por item, na ordem de nItem)."""
+    dets = inf_nfe.get("det") or []
+    # xmltodict devolve dict quando há um só det e lista quando há vários
+    if isinstance(dets, dict):
+        dets = [dets]
+    itens = []
+    for det in dets:
+        campos = {campo: ler(det) for campo, ler in _LEITORES_ITEM}
+        campos["n_item"] = det.get("@nItem") or str(len(itens) + 1)
+        campos["v_icms"] = _icms_item(det)
+        itens.append(campos)
+    return itens
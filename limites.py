@@ -0,0 +1,265 @@
+# limites.py
+
+import asyncio
+import os
+from contextlib import asynccontextmanager
+from typing import List
+from xml.parsers import expat as _expat
+
+import xmltodict
+from fastapi import HTTPException, UploadFile
+from starlette.responses import JSONResponse
+
+from rastreamento import span
+from tenants import PorTenant
+
+
+def _env_int(nome: str, padrao: int) -> int:
+    return int(os.getenv(nome, str(padrao)))
+
+
+# Limites configuráveis por variável de ambiente.
+# Obs.: o parser multipart do Starlette recusa mais de 1000 arquivos por
+# requisição, então valores acima disso em MAX_ARQUIVOS_POR_REQUISICAO não têm efeito.
+MAX_ARQUIVOS_POR_REQUISICAO = _env_int("MAX_ARQUIVOS_POR_REQUISICAO", 1000)
+MAX_BYTES_POR_ARQUIVO = _env_int("MAX_BYTES_POR_ARQUIVO", 2 * 1024 * 1024)
+MAX_BYTES_POR_REQUISICAO = _env_int("MAX_BYTES_POR_REQUISICAO", 256 * 1024 * 1024)
+MAX_BYTES_EM_VOO = _env_int("MAX_BYTES_EM_VOO", 1024 * 1024 * 1024)
+MAX_BYTES_EM_VOO_POR_TENANT = _env_int("MAX_BYTES_EM_VOO_POR_TENANT", MAX_BYTES_EM_VOO // 2)
+MAX_PROFUNDIDADE_XML = _env_int("MAX_PROFUNDIDADE_XML", 64)
+TIMEOUT_ADMISSAO_S = float(os.getenv("TIMEOUT_ADMISSAO_S", "10"))
+
+
+class LimiteExcedido(Exception):
+    """Requisição recusada por limite de recursos (vira 413 ou 503 na API)."""
+
+    def __init__(self, mensagem: str, status_code: int = 413, retry_after: int = 0):
+        super().__init__(mensagem)
+        self.status_code = status_code
+        self.retry_after = retry_after
+
+
+class XMLRecusado(ValueError):
+    """XML recusado pelo parser endurecido ou malformado (vira 400 na API)."""
+
+
+# Parser endurecido
+
+class _ParserEndurecido:
+    """
+    Envolve o parser do expat usado pelo xmltodict: recusa DOCTYPE/DTD
+    (nenhuma NF-e usa) e aninhamento acima de MAX_PROFUNDIDADE_XML.
+    Declarações de entidade já são bloqueadas pelo `disable_entities` do xmltodict.
+    """
+
+    def __init__(self, parser, profundidade_maxima: int):
+        object.__setattr__(self, "_parser", parser)
+        object.__setattr__(self, "_profundidade", 0)
+        object.__setattr__(self, "_profundidade_maxima", profundidade_maxima)
+        parser.StartDoctypeDeclHandler = self._recusar_doctype
+
+    def __getattr__(self, nome):
+        return getattr(self._parser, nome)
+
+    def __setattr__(self, nome, valor):
+        if nome == "StartElementHandler":
+            valor = self._contar_entrada(valor)
+        elif nome == "EndElementHandler":
+            valor = self._contar_saida(valor)
+        setattr(self._parser, nome, valor)
+
+    def _contar_entrada(self, handler):
+        def start(*args):
+            profundidade = self._profundidade + 1
+            if profundidade > self._profundidade_maxima:
+                raise XMLRecusado(
+                    f"XML com aninhamento acima do limite ({self._profundidade_maxima})"
+                )
+            object.__setattr__(self, "_profundidade", profundidade)
+            return handler(*args)
+
+        return start
+
+    def _contar_saida(self, handler):
+        def end(*args):
+            object.__setattr__(self, "_profundidade", self._profundidade - 1)
+            return handler(*args)
+
+        return end
+
+    @staticmethod
+    def _recusar_doctype(*_args):
+        raise XMLRecusado("XML com DOCTYPE/DTD não é aceito")
+
+
+class _ExpatEndurecido:
+    """Substituto do módulo expat passado para `xmltodict.parse(expat=...)`."""
+
+    def __init__(self, profundidade_maxima: int):
+        self.profundidade_maxima = profundidade_maxima
+
+    def ParserCreate(self, *args, **kwargs):
+        parser = _expat.ParserCreate(*args, **kwargs)
+        return _ParserEndurecido(parser, self.profundidade_maxima)
+
+
+_expat_endurecido = _ExpatEndurecido(MAX_PROFUNDIDADE_XML)
+
+
+def parse_xml_seguro(conteudo: bytes) -> dict:
+    """
+    xmltodict.parse sem DTD, sem entidades e com profundidade limitada.
+    Recusas e XML malformado saem como XMLRecusado.
+    """
+    try:
+        return xmltodict.parse(conteudo, expat=_expat_endurecido, disable_entities=True)
+    except _expat.ExpatError as e:
+        raise XMLRecusado(f"XML malformado: {e}") from e
+
+
+# Limites por requisição / por arquivo
+
+def validar_uploads(files: List[UploadFile]) -> int:
+    """
+    Confere quantidade e tamanho dos arquivos antes de ler qualquer um.
+    Retorna o total de bytes, usado para reservar espaço no controle de admissão.
+    """
+    if len(files) > MAX_ARQUIVOS_POR_REQUISICAO:
+        raise LimiteExcedido(
+            f"Máximo de {MAX_ARQUIVOS_POR_REQUISICAO} arquivos por requisição "
+            f"(recebidos {len(files)})"
+        )
+
+    total = 0
+    for file in files:
+        tamanho = file.size or 0
+        if tamanho > MAX_BYTES_POR_ARQUIVO:
+            raise LimiteExcedido(
+                f"Arquivo {file.filename} excede {MAX_BYTES_POR_ARQUIVO} bytes"
+            )
+        total += tamanho
+
+    if total > MAX_BYTES_POR_REQUISICAO:
+        raise LimiteExcedido(
+            f"Requisição excede {MAX_BYTES_POR_REQUISICAO} bytes (recebidos {total})"
+        )
+    return total
+
+
+async def ler_upload(file: UploadFile) -> bytes:
+    """Lê o arquivo sem nunca passar de MAX_BYTES_POR_ARQUIVO em memória."""
+    conteudo = await file.read(MAX_BYTES_POR_ARQUIVO + 1)
+    if len(conteudo) > MAX_BYTES_POR_ARQUIVO:
+        raise LimiteExcedido(f"Arquivo {file.filename} excede {MAX_BYTES_POR_ARQUIVO} bytes")
+    return conteudo
+
+
+class LimiteCorpoRequisicao:
+    """
+    Middleware ASGI que limita o corpo da requisição a `max_bytes`. Recusa
+    pelo Content-Length antes de o multipart ser lido/armazenado e, para
+    corpos sem Content-Length (Transfer-Encoding: chunked), conta os bytes
+    conforme chegam: passou do limite, a leitura do corpo falha com 413.
+    """
+
+    def __init__(self, app, max_bytes: int):
+        self.app = app
+        self.max_bytes = max_bytes
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        detalhe = f"Requisição excede {self.max_bytes} bytes"
+        for nome, valor in scope["headers"]:
+            if nome == b"content-length" and valor.isdigit() and int(valor) > self.max_bytes:
+                await JSONResponse(status_code=413, content={"detail": detalhe})(
+                    scope, receive, send
+                )
+                return
+
+        recebidos = 0
+
+        async def receber():
+            nonlocal recebidos
+            mensagem = await receive()
+            if mensagem["type"] == "http.request":
+                recebidos += len(mensagem.get("body", b""))
+                if recebidos > self.max_bytes:
+                    # HTTPException atravessa o parse do corpo no FastAPI e vira
+                    # a resposta 413 (outras exceções virariam 400)
+                    raise HTTPException(status_code=413, detail=detalhe)
+            return mensagem
+
+        await self.app(scope, receber, send)
+
+
+# Controle de admissão global
+
+class ControleAdmissao:
+    """
+    Limita o total de bytes de lotes em processamento ao mesmo tempo no worker.
+
+    Cada requisição reserva o tamanho do seu upload antes de começar. Se não
+    houver espaço, espera até `timeout` segundos; depois disso é recusada
+    com 503 + Retry-After, em vez de derrubar o worker por falta de memória.
+    """
+
+    def __init__(self, max_bytes: int = MAX_BYTES_EM_VOO, timeout: float = TIMEOUT_ADMISSAO_S):
+        self.max_bytes = max_bytes
+        self.timeout = timeout
+        self.em_voo = 0
+        self._condicao = asyncio.Condition()
+
+    @asynccontextmanager
+    async def reservar(self, n_bytes: int):
+        n_bytes = max(n_bytes, 1)
+        if n_bytes > self.max_bytes:
+            raise LimiteExcedido(
+                f"Lote de {n_bytes} bytes excede a capacidade do servidor ({self.max_bytes})"
+            )
+
+        # O span mede só a espera na fila, não o processamento do lote
+        with span("admissao", bytes=n_bytes, max_bytes=self.max_bytes):
+            async with self._condicao:
+                try:
+                    await asyncio.wait_for(
+                        self._condicao.wait_for(lambda: self.em_voo + n_bytes <= self.max_bytes),
+                        timeout=self.timeout,
+                    )
+                except asyncio.TimeoutError:
+                    raise LimiteExcedido(
+                        "Servidor ocupado processando outros lotes, tente novamente",
+                        status_code=503,
+                        retry_after=max(1, int(self.timeout)),
+                    )
+                self.em_voo += n_bytes
+
+        try:
+            yield
+        finally:
+            async with self._condicao:
+                self.em_voo -= n_bytes
+                self._condicao.notify_all()
+
+    def estado(self) -> dict:
+        return {"bytes_em_voo": self.em_voo, "max_bytes_em_voo": self.max_bytes}
+
+
+# Controle global do worker e, dentro dele, uma fatia por tenant: o fechamento
+# de mês de um cliente grande não ocupa o worker inteiro. A fatia de um tenant
+# só é descartada sem bytes em voo
+controle_admissao = ControleAdmissao()
+controles_por_tenant = PorTenant(
+    lambda tenant: ControleAdmissao(MAX_BYTES_EM_VOO_POR_TENANT),
+    ocioso=lambda controle: controle.em_voo == 0,
+)
+
+
+@asynccontextmanager
+async def admitir(tenant: str, n_bytes: int):
+    """Reserva `n_bytes` na fatia do tenant e no total do worker."""
+    async with controles_por_tenant[tenant].reservar(n_bytes):
+        async with controle_admissao.reservar(n_bytes):
+            yield
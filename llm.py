@@ -0,0 +1,273 @@
+# llm.py
+
+import contextvars
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Protocol
+
+MODELO_PADRAO = "llama-3.3-70b-versatile"  # modelo da Groq [web:502][web:504]
+
+# URL do stub local (stub_llm.py), usado com LLM_BACKEND=stub
+URL_STUB_PADRAO = "http://127.0.0.1:8001"
+
+# Espera máxima por um pedaço da resposta do LLM
+TIMEOUT_LLM_S = float(os.getenv("LLM_TIMEOUT_S", "120"))
+
+
+class BackendLLM(Protocol):
+    """Interface mínima que o ia_agente usa para falar com um LLM."""
+
+    def completar(self, mensagens: List[dict], temperatura: float) -> str:
+        ...
+
+    def completar_stream(self, mensagens: List[dict], temperatura: float) -> Iterator[str]:
+        ...
+
+
+class BackendGroq:
+    """
+    API da Groq (compatível com OpenAI). Com `base_url` aponta para outro
+    servidor com a mesma API, como o stub local de testes de carga.
+    """
+
+    def __init__(
+        self,
+        api_key: Optional[str],
+        modelo: str = MODELO_PADRAO,
+        base_url: Optional[str] = None,
+        max_retries: int = 2,
+    ):
+        self.api_key = api_key
+        self.modelo = modelo
+        self.base_url = base_url
+        self.max_retries = max_retries
+        self._cliente = None
+
+    @property
+    def cliente(self):
+        # SDK importado só na primeira chamada (ver bench_startup.py)
+        if self._cliente is None:
+            from groq import Groq  # SDK oficial da Groq [web:500][web:507]
+
+            self._cliente = Groq(
+                api_key=self.api_key, base_url=self.base_url, max_retries=self.max_retries
+            )
+        return self._cliente
+
+    def completar(self, mensagens: List[dict], temperatura: float) -> str:
+        chat_completion = self.cliente.chat.completions.create(
+            model=self.modelo, messages=mensagens, temperature=temperatura
+        )
+        return chat_completion.choices[0].message.content.strip()
+
+    def completar_stream(self, mensagens: List[dict], temperatura: float) -> Iterator[str]:
+        stream = self.cliente.chat.completions.create(
+            model=self.modelo, messages=mensagens, temperature=temperatura, stream=True
+        )
+        for chunk in stream:
+            texto = chunk.choices[0].delta.content if chunk.choices else None
+            if texto:
+                yield texto
+
+
+def texto_deterministico(mensagens: List[dict], palavras: int = 60) -> str:
+    """
+    Resposta fixa para um mesmo conjunto de mensagens: derivada do hash do
+    prompt, sem rede. Usada pelo backend local e pelo stub_llm.
+    """
+    digest = hashlib.sha256(repr(mensagens).encode("utf-8")).hexdigest()
+    vocabulario = (
+        "faturamento emissores icms concentração período notas total valor "
+        "principais maiores análise resumo tributário operação mercado"
+    ).split()
+    corpo = " ".join(
+        vocabulario[int(digest[i % 64], 16) % len(vocabulario)] for i in range(palavras)
+    )
+    return f"[resumo simulado {digest[:8]}] {corpo}."
+
+
+class BackendLocal:
+    """Backend determinístico em processo, com latência simulada opcional."""
+
+    def __init__(self, latencia_ms: float = 0.0):
+        self.latencia_ms = latencia_ms
+
+    def completar(self, mensagens: List[dict], temperatura: float) -> str:
+        if self.latencia_ms:
+            time.sleep(self.latencia_ms / 1000)
+        return texto_deterministico(mensagens)
+
+    def completar_stream(self, mensagens: List[dict], temperatura: float) -> Iterator[str]:
+        for palavra in self.completar(mensagens, temperatura).split(" "):
+            yield palavra + " "
+
+
+@lru_cache(maxsize=1)
+def obter_backend() -> BackendLLM:
+    """
+    Backend escolhido por LLM_BACKEND (lido uma vez, no primeiro uso):
+    - groq  (padrão): API da Groq com GROQ_API_KEY
+    - stub : mesma API, apontando para o stub_llm em LLM_STUB_URL
+    - local: texto determinístico em processo, latência em LLM_LOCAL_LATENCIA_MS
+    """
+    from dotenv import load_dotenv
+
+    load_dotenv()  # Carrega as variáveis de ambiente do arquivo .env
+
+    nome = os.getenv("LLM_BACKEND", "groq").lower()
+    max_retries = int(os.getenv("LLM_MAX_RETRIES", "2"))
+    if nome == "groq":
+        return BackendGroq(os.getenv("GROQ_API_KEY"), max_retries=max_retries)
+    if nome == "stub":
+        return BackendGroq(
+            os.getenv("GROQ_API_KEY") or "stub",
+            base_url=os.getenv("LLM_STUB_URL", URL_STUB_PADRAO),
+            max_retries=max_retries,
+        )
+    if nome == "local":
+        return BackendLocal(float(os.getenv("LLM_LOCAL_LATENCIA_MS", "0")))
+    raise ValueError(f"LLM_BACKEND desconhecido: {nome}")
+
+
+class _Transmissao:
+    """
+    Pedaços de uma resposta em geração, produzidos por uma thread própria e
+    lidos por todos os pedidos do mesmo prompt. Quem lê espera só pelo
+    próximo pedaço, e o produtor não depende do threadpool de quem lê.
+    """
+
+    def __init__(self):
+        self.partes: List[str] = []
+        self.fim = False
+        self.erro: Optional[BaseException] = None
+        self._condicao = threading.Condition()
+
+    def produzir(self, abrir: Callable[[], Iterable[str]]) -> None:
+        try:
+            for parte in abrir():
+                with self._condicao:
+                    self.partes.append(parte)
+                    self._condicao.notify_all()
+        except BaseException as e:
+            self.erro = e
+        finally:
+            with self._condicao:
+                self.fim = True
+                self._condicao.notify_all()
+
+    def ler(self, timeout: float) -> Iterator[str]:
+        lidas = 0
+        while True:
+            with self._condicao:
+                if not self._condicao.wait_for(lambda: lidas < len(self.partes) or self.fim, timeout):
+                    raise TimeoutError(f"LLM sem resposta em {timeout:.0f} s")
+                novas = self.partes[lidas:]
+                terminou = self.fim
+            lidas += len(novas)
+            yield from novas
+            if terminou and not novas:
+                if self.erro is not None:
+                    raise self.erro
+                return
+
+
+class CacheRespostas:
+    """
+    LRU de respostas do LLM por hash do prompt, com contadores de acerto.
+    Pedidos simultâneos do mesmo prompt compartilham uma única chamada ao
+    backend, feita numa thread própria (ver `_Transmissao`).
+    """
+
+    def __init__(self, capacidade: int = 256, timeout: float = TIMEOUT_LLM_S):
+        self.capacidade = capacidade
+        self.timeout = timeout
+        self.acertos = 0
+        self.faltas = 0
+        self._itens: "OrderedDict[str, str]" = OrderedDict()
+        self._em_andamento: Dict[str, _Transmissao] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def chave(mensagens: List[dict], temperatura: float) -> str:
+        return hashlib.sha256(repr((mensagens, temperatura)).encode("utf-8")).hexdigest()
+
+    def obter(self, chave: str) -> Optional[str]:
+        with self._lock:
+            texto = self._itens.get(chave)
+            if texto is None:
+                self.faltas += 1
+                return None
+            self._itens.move_to_end(chave)
+            self.acertos += 1
+            return texto
+
+    def obter_ou_gerar(self, chave: str, gerar: Callable[[], str]) -> str:
+        """Resposta do cache ou, na falta, de `gerar()` (chamado uma vez por chave)."""
+        return "".join(self.obter_ou_transmitir(chave, lambda: [gerar()]))
+
+    def obter_ou_transmitir(self, chave: str, abrir: Callable[[], Iterable[str]]) -> Iterator[str]:
+        """
+        `obter_ou_gerar` em pedaços: na falta, repassa os pedaços de `abrir()`
+        à medida que chegam e guarda o texto completo no fim. Quem pede a
+        mesma chave durante a geração lê os mesmos pedaços, sem nova chamada.
+        Nenhuma trava fica presa entre um pedaço e outro; a geração vai até o
+        fim mesmo se quem pediu desconectar.
+        """
+        with self._lock:
+            texto = self._itens.get(chave)
+            if texto is not None:
+                self._itens.move_to_end(chave)
+                self.acertos += 1
+            else:
+                transmissao = self._em_andamento.get(chave)
+                if transmissao is None:
+                    self.faltas += 1
+                    transmissao = self._em_andamento[chave] = _Transmissao()
+                    # Contexto copiado: o span do backend continua o trace da requisição
+                    contexto = contextvars.copy_context()
+                    threading.Thread(
+                        target=contexto.run,
+                        args=(self._gerar, chave, transmissao, abrir),
+                        name="llm-resposta",
+                        daemon=True,
+                    ).start()
+                else:
+                    self.acertos += 1
+        if texto is not None:
+            yield texto
+            return
+        yield from transmissao.ler(self.timeout)
+
+    def _gerar(self, chave: str, transmissao: _Transmissao, abrir: Callable[[], Iterable[str]]) -> None:
+        try:
+            transmissao.produzir(abrir)
+            if transmissao.erro is None:
+                self.guardar(chave, "".join(transmissao.partes).strip())
+        finally:
+            with self._lock:
+                self._em_andamento.pop(chave, None)
+
+    def guardar(self, chave: str, texto: str) -> None:
+        with self._lock:
+            self._itens[chave] = texto
+            self._itens.move_to_end(chave)
+            while len(self._itens) > self.capacidade:
+                self._itens.popitem(last=False)
+
+    def estatisticas(self) -> dict:
+        with self._lock:
+            total = self.acertos + self.faltas
+            return {
+                "acertos": self.acertos,
+                "faltas": self.faltas,
+                "taxa_acerto": self.acertos / total if total else 0.0,
+                "itens": len(self._itens),
+                "capacidade": self.capacidade,
+            }
+
+
+cache_respostas = CacheRespostas(int(os.getenv("LLM_CACHE_ITENS", "256")))
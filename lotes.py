@@ -0,0 +1,355 @@
+# lotes.py
+
+import json
+import os
+import re
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import TYPE_CHECKING, Dict, Iterator, List, Optional, Tuple
+
+from dinheiro import centavos_para_reais
+from eventos import indices_eventos
+from modelos import NotaFiscal, totais_centavos
+from rastreamento import rastreado
+from tenants import tenant_valido
+
+if TYPE_CHECKING:
+    import pyarrow as pa
+
+DIRETORIO_LOTES = os.getenv("DIRETORIO_LOTES", "lotes")
+MAX_WORKERS_PARTICOES = int(os.getenv("MAX_WORKERS_PARTICOES", "8"))
+
+ARQUIVO_RESUMO = "resumo.json"
+
+LIMITE_PAGINA_PADRAO = 500
+LIMITE_PAGINA_MAXIMO = 5000
+
+_LOTE_ID = re.compile(r"^[0-9a-f]{32}$")
+_CURSOR = re.compile(r"^(\d+):(\d+)$")
+
+
+class LoteNaoEncontrado(KeyError):
+    pass
+
+
+def nome_particao(cnpj_emit: str) -> str:
+    cnpj = re.sub(r"\D", "", cnpj_emit)
+    return f"emit_{cnpj or 'sem_cnpj'}.ndjson"
+
+
+class ArmazemLotes:
+    """
+    Guarda as notas de cada lote em disco, em lotes/<tenant>/<lote_id>/,
+    particionadas por CNPJ do emitente: um NDJSON (uma nota por linha) por
+    emitente, mais um resumo.json com os totais do lote e o índice das
+    partições (arquivo, quantidade e totais de cada emitente).
+
+    A paginação usa como cursor "<partição>:<offset em bytes>", então ler
+    qualquer página (ou transmitir o lote inteiro) custa memória constante,
+    e filtrar por um emitente lê só a partição dele.
+
+    Com as tabelas Arrow do lote (ver colunar.py), grava também notas.arrow
+    e itens.arrow, listados em "colunar" no resumo.
+
+    Um cancelamento que chega depois de o lote ser salvo é conciliado na
+    leitura: o resumo guarda quantos cancelamentos do tenant já conferiu e,
+    quando o índice de eventos tem mais, as notas canceladas saem dos totais
+    do lote e das partições (listadas em "canceladas_depois") e das páginas.
+    Os arquivos .arrow continuam sendo o retrato do lote no processamento.
+    """
+
+    def __init__(self, diretorio: str = DIRETORIO_LOTES):
+        self.diretorio = diretorio
+        self._lock = threading.Lock()
+
+    @rastreado("lotes.salvar")
+    def salvar(
+        self,
+        tenant: str,
+        notas: List[NotaFiscal],
+        resumo: dict,
+        tabelas: Optional[Dict[str, "pa.Table"]] = None,
+        cancelamentos_vistos: int = 0,
+    ) -> str:
+        """
+        `cancelamentos_vistos`: contagem de cancelamentos do tenant lida antes
+        de as notas canceladas serem tiradas do lote (ver `resumo`).
+        """
+        lote_id = uuid.uuid4().hex
+        pasta = os.path.join(self.diretorio, tenant, lote_id)
+        os.makedirs(pasta)
+
+        por_cnpj: Dict[str, List[NotaFiscal]] = {}
+        for nota in notas:
+            por_cnpj.setdefault(nota.cnpj_emit, []).append(nota)
+
+        # Cada partição é gravada e somada de forma independente, em paralelo
+        with ThreadPoolExecutor(max_workers=max(1, min(MAX_WORKERS_PARTICOES, len(por_cnpj)))) as pool:
+            particoes = list(
+                pool.map(lambda item: _gravar_particao(pasta, *item), por_cnpj.items())
+            )
+        particoes.sort(key=lambda p: p["total_nf_centavos"], reverse=True)
+
+        colunar = []
+        if tabelas is not None:
+            from colunar import gravar_arrow
+
+            colunar = gravar_arrow(pasta, tabelas)
+
+        resumo = {
+            "lote_id": lote_id,
+            "tenant": tenant,
+            "criado_em": int(time.time()),
+            **resumo,
+            "particoes": particoes,
+            "colunar": colunar,
+            "cancelamentos_vistos": cancelamentos_vistos,
+            "canceladas_depois": [],
+        }
+        _gravar_json(os.path.join(pasta, ARQUIVO_RESUMO), resumo)
+
+        return lote_id
+
+    def resumo(self, tenant: str, lote_id: str) -> dict:
+        """Resumo do lote, sem as notas canceladas depois de ele ser salvo."""
+        caminho = self._caminho(tenant, lote_id, ARQUIVO_RESUMO)
+        resumo = _ler_json(caminho)
+        if resumo.get("cancelamentos_vistos", 0) != _cancelamentos(tenant):
+            resumo = self._conciliar(tenant, lote_id, caminho)
+        return resumo
+
+    def particoes(self, tenant: str, lote_id: str, cnpj_emit: Optional[str] = None) -> List[dict]:
+        return _filtrar(self.resumo(tenant, lote_id)["particoes"], cnpj_emit)
+
+    def pagina(
+        self,
+        tenant: str,
+        lote_id: str,
+        cursor: str = "",
+        limite: int = LIMITE_PAGINA_PADRAO,
+        cnpj_emit: Optional[str] = None,
+    ) -> Tuple[List[dict], Optional[str]]:
+        """
+        Lê até `limite` notas a partir do `cursor` (vazio = início).
+        Retorna as notas e o cursor da próxima página (None no fim do lote).
+        """
+        limite = max(1, min(limite, LIMITE_PAGINA_MAXIMO))
+        resumo = self.resumo(tenant, lote_id)
+        particoes = _filtrar(resumo["particoes"], cnpj_emit)
+        canceladas = _chaves_canceladas(resumo)
+        indice, offset = _ler_cursor(cursor)
+
+        notas = []
+        while indice < len(particoes):
+            caminho = self._caminho(tenant, lote_id, particoes[indice]["arquivo"])
+            with open(caminho, "rb") as f:
+                f.seek(offset)
+                if offset and not _inicio_de_linha(f, offset):
+                    raise ValueError(f"Cursor inválido: {cursor}")
+                while len(notas) < limite:
+                    linha = f.readline()
+                    if not linha:
+                        break
+                    nota = json.loads(linha)
+                    if nota["chave"] not in canceladas:
+                        notas.append(nota)
+                if len(notas) == limite:
+                    posicao = f.tell()
+                    if f.readline():
+                        return notas, f"{indice}:{posicao}"
+                    return notas, (f"{indice + 1}:0" if indice + 1 < len(particoes) else None)
+            indice, offset = indice + 1, 0
+        return notas, None
+
+    def blocos_ndjson(
+        self,
+        tenant: str,
+        lote_id: str,
+        cnpj_emit: Optional[str] = None,
+        tamanho_bloco: int = 64 * 1024,
+    ) -> Iterator[bytes]:
+        """Conteúdo NDJSON do lote (partição a partição) em blocos, para StreamingResponse."""
+        resumo = self.resumo(tenant, lote_id)
+        canceladas = _chaves_canceladas(resumo)
+        for particao in _filtrar(resumo["particoes"], cnpj_emit):
+            with open(self._caminho(tenant, lote_id, particao["arquivo"]), "rb") as f:
+                if canceladas:
+                    # Só com notas canceladas depois é preciso olhar linha a linha;
+                    # as linhas mantidas saem nos mesmos blocos de ~tamanho_bloco
+                    bloco, tamanho = [], 0
+                    for linha in f:
+                        if json.loads(linha)["chave"] in canceladas:
+                            continue
+                        bloco.append(linha)
+                        tamanho += len(linha)
+                        if tamanho >= tamanho_bloco:
+                            yield b"".join(bloco)
+                            bloco, tamanho = [], 0
+                    if bloco:
+                        yield b"".join(bloco)
+                    continue
+                while True:
+                    bloco = f.read(tamanho_bloco)
+                    if not bloco:
+                        break
+                    yield bloco
+
+    def tem_lotes(self, tenant: str) -> bool:
+        pasta = os.path.join(self.diretorio, tenant)
+        if not tenant_valido(tenant) or not os.path.isdir(pasta):
+            return False
+        return any(_LOTE_ID.match(lote_id) for lote_id in os.listdir(pasta))
+
+    def lotes(self, tenant: str) -> List[str]:
+        """lote_ids salvos do tenant, do mais antigo ao mais novo."""
+        pasta = os.path.join(self.diretorio, tenant)
+        if not tenant_valido(tenant) or not os.path.isdir(pasta):
+            return []
+        resumos = []
+        for lote_id in os.listdir(pasta):
+            if not _LOTE_ID.match(lote_id):
+                continue
+            try:
+                resumos.append(self.resumo(tenant, lote_id))
+            except LoteNaoEncontrado:
+                continue  # ainda sendo gravado: o resumo.json é o último arquivo
+        resumos.sort(key=lambda r: (r["criado_em"], r["lote_id"]))
+        return [r["lote_id"] for r in resumos]
+
+    def notas_salvas(self, tenant: str) -> Iterator[dict]:
+        """Todas as notas salvas do tenant, lote a lote (para refazer agregados)."""
+        for lote_id in self.lotes(tenant):
+            for particao in self.particoes(tenant, lote_id):
+                with open(self._caminho(tenant, lote_id, particao["arquivo"]), encoding="utf-8") as f:
+                    for linha in f:
+                        yield _com_centavos(json.loads(linha))
+
+    def caminho_colunar(self, tenant: str, lote_id: str, tabela: str) -> str:
+        """Caminho do <tabela>.arrow do lote (LoteNaoEncontrado se não houver)."""
+        nome = f"{tabela}.arrow"
+        if nome not in self.resumo(tenant, lote_id).get("colunar", []):
+            raise LoteNaoEncontrado(lote_id)
+        return self._caminho(tenant, lote_id, nome)
+
+    def _conciliar(self, tenant: str, lote_id: str, caminho: str) -> dict:
+        """Tira do resumo as notas do lote canceladas desde a última conferência."""
+        indice = indices_eventos.obter(tenant)
+        if indice is None:
+            return _ler_json(caminho)
+        with self._lock:
+            # Relido sob a trava: outra requisição pode ter acabado de conciliar
+            resumo = _ler_json(caminho)
+            vistos = indice.cancelamentos
+            if resumo.get("cancelamentos_vistos", 0) == vistos:
+                return resumo
+
+            canceladas = resumo.setdefault("canceladas_depois", [])
+            ja_estornadas = _chaves_canceladas(resumo)
+            for particao in resumo["particoes"]:
+                with open(self._caminho(tenant, lote_id, particao["arquivo"]), encoding="utf-8") as f:
+                    for linha in f:
+                        nota = json.loads(linha)
+                        if nota["chave"] in ja_estornadas or not indice.cancelada(nota["chave"]):
+                            continue
+                        nota = _com_centavos(nota)
+                        for totais, qtd, total_nf, icms in (
+                            (particao, "qtd", "total_nf_centavos", "icms_centavos"),
+                            (resumo, "qtd", "total_geral_centavos", "total_icms_centavos"),
+                        ):
+                            totais[qtd] -= 1
+                            totais[total_nf] -= nota["total_nf_centavos"]
+                            totais[icms] -= nota["icms_centavos"]
+                        canceladas.append({"arquivo": nota["arquivo"], "chave": nota["chave"]})
+                        ja_estornadas.add(nota["chave"])
+
+            resumo["total_geral"] = centavos_para_reais(resumo["total_geral_centavos"])
+            resumo["total_icms"] = centavos_para_reais(resumo["total_icms_centavos"])
+            resumo["cancelamentos_vistos"] = vistos
+            _gravar_json(caminho, resumo)
+            return resumo
+
+    def _caminho(self, tenant: str, lote_id: str, nome: str) -> str:
+        # tenant e lote_id vêm da requisição: só aceitamos os formatos esperados
+        if not tenant_valido(tenant) or not _LOTE_ID.match(lote_id):
+            raise LoteNaoEncontrado(lote_id)
+        caminho = os.path.join(self.diretorio, tenant, lote_id, nome)
+        if not os.path.exists(caminho):
+            raise LoteNaoEncontrado(lote_id)
+        return caminho
+
+
+def _gravar_particao(pasta: str, cnpj_emit: str, notas: List[NotaFiscal]) -> dict:
+    arquivo = nome_particao(cnpj_emit)
+    with open(os.path.join(pasta, arquivo), "w", encoding="utf-8") as f:
+        for nota in notas:
+            f.write(json.dumps(nota.como_dict(), ensure_ascii=False))
+            f.write("\n")
+
+    total_nf, icms = totais_centavos(notas)
+    return {
+        "cnpj_emit": cnpj_emit,
+        "nome_emit": notas[0].nome_emit,
+        "arquivo": arquivo,
+        "qtd": len(notas),
+        "total_nf_centavos": total_nf,
+        "icms_centavos": icms,
+    }
+
+
+def _cancelamentos(tenant: str) -> int:
+    indice = indices_eventos.obter(tenant)
+    return indice.cancelamentos if indice is not None else 0
+
+
+def _ler_json(caminho: str) -> dict:
+    with open(caminho, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _gravar_json(caminho: str, dados: dict) -> None:
+    # Grava em .tmp e renomeia: quem lê nunca vê o resumo pela metade
+    temporario = caminho + ".tmp"
+    with open(temporario, "w", encoding="utf-8") as f:
+        json.dump(dados, f, ensure_ascii=False)
+    os.replace(temporario, caminho)
+
+
+def _filtrar(particoes: List[dict], cnpj_emit: Optional[str]) -> List[dict]:
+    if cnpj_emit is None:
+        return particoes
+    return [p for p in particoes if p["cnpj_emit"] == cnpj_emit]
+
+
+def _chaves_canceladas(resumo: dict) -> set:
+    return {n["chave"] for n in resumo.get("canceladas_depois", [])}
+
+
+def _com_centavos(nota: dict) -> dict:
+    # Lotes gravados antes dos campos em centavos: os reais têm no máximo
+    # 2 casas, o arredondamento recupera o valor exato
+    if "total_nf_centavos" not in nota:
+        nota["total_nf_centavos"] = round(nota["total_nf"] * 100)
+        nota["icms_centavos"] = round(nota["icms"] * 100)
+    return nota
+
+
+def _ler_cursor(cursor: str) -> Tuple[int, int]:
+    if not cursor:
+        return 0, 0
+    m = _CURSOR.match(cursor)
+    if not m:
+        raise ValueError(f"Cursor inválido: {cursor}")
+    return int(m.group(1)), int(m.group(2))
+
+
+def _inicio_de_linha(f, cursor: int) -> bool:
+    """Confere se o cursor aponta para o começo de uma nota (byte anterior é \\n)."""
+    f.seek(cursor - 1)
+    anterior = f.read(1)
+    return anterior == b"\n"
+
+
+# Armazém global de lotes (particionado por tenant/CNPJ em disco)
+armazem_lotes = ArmazemLotes()
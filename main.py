@@ -1,32 +1,123 @@
+import os
 import time
-from typing import List
+import uuid
+from typing import List, Optional
 
-import pandas as pd
-import xmltodict
-from fastapi import FastAPI, File, HTTPException, UploadFile
+from fastapi import Depends, FastAPI, File, HTTPException, Query, UploadFile
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import FileResponse, HTMLResponse
-from fastapi.staticfiles import StaticFiles
+from fastapi.responses import (
+    FileResponse,
+    HTMLResponse,
+    JSONResponse,
+    PlainTextResponse,
+    StreamingResponse,
+)
+from starlette.concurrency import run_in_threadpool
+from starlette.middleware.gzip import DEFAULT_EXCLUDED_CONTENT_TYPES
+from starlette.requests import Request
+
+from colunar import TABELAS, pyarrow_disponivel
+from cubos import CuboAgregados, cubos
+from dinheiro import centavos_para_reais, para_centavos
+from estaticos import (
+    CACHE_ASSETS,
+    CACHE_IMUTAVEL,
+    CACHE_REVALIDAR,
+    CatalogoEstatico,
+    GZipNegociado,
+)
+from eventos import (
+    EventoNFe,
+    IndiceEventos,
+    chave_da_nfe,
+    eh_evento,
+    extrair_evento,
+    indices_eventos,
+)
+from layouts import (
+    UF_POR_CODIGO,
+    LayoutNaoSuportado,
+    detectar_layout,
+    extrair_campos,
+    extrair_itens,
+    localizar_inf_nfe,
+)
+from limites import (
+    MAX_BYTES_POR_REQUISICAO,
+    LimiteCorpoRequisicao,
+    LimiteExcedido,
+    XMLRecusado,
+    admitir,
+    controle_admissao,
+    ler_upload,
+    parse_xml_seguro,
+    validar_uploads,
+)
+from llm import cache_respostas
+from lotes import (
+    LIMITE_PAGINA_MAXIMO,
+    LIMITE_PAGINA_PADRAO,
+    LoteNaoEncontrado,
+    armazem_lotes,
+)
+from modelos import ItemNota, NotaFiscal, totais_centavos
+from perfilador import DURACAO_MAXIMA_S, exigir_admin, perfilador
+from rastreamento import TIPO_SERVIDOR, rastreado, span
+from tenants import obter_tenant
 
-from gerar_relatorio_pdf import gerar_relatorio_pdf
-from ia_agente import gerar_resumo_nf
+# Relatórios Excel/PDF ficam em relatorios/<tenant>/
+DIRETORIO_RELATORIOS = os.getenv("DIRETORIO_RELATORIOS", "relatorios")
 
 
 def extrair_inf_nfe(data: dict) -> dict:
+    """Retorna sempre o dict de infNFe (nfeProc -> NFe -> infNFe ou NFe -> infNFe)."""
+    return localizar_inf_nfe(data)
+
+
+# Campos sem os quais a nota não entra no relatório
+CAMPOS_OBRIGATORIOS = ("cnpj_emit", "nome_emit", "v_nf", "v_icms")
+
+
+def ler_campos(nfe: dict) -> dict:
     """
-    Aceita tanto:
-    - nfeProc -> NFe -> infNFe
-    - NFe -> infNFe
-    Retorna sempre o dict de infNFe.
+    Lê os campos da nota pelo mapa do layout (versão 1.10 a 4.00, NF-e ou
+    NFC-e), escolhido uma vez pelo atributo versao e por ide/mod.
     """
-    if "nfeProc" in data:
-        return data["nfeProc"]["NFe"]["infNFe"]
-    if "NFe" in data:
-        return data["NFe"]["infNFe"]
-    for k in data.keys():
-        if k.endswith("NFe"):
-            return data[k]["infNFe"]
-    raise KeyError("Estrutura de NF-e não reconhecida")
+    campos = extrair_campos(nfe, detectar_layout(nfe))
+    faltando = [c for c in CAMPOS_OBRIGATORIOS if not campos[c]]
+    if faltando:
+        raise KeyError(f"Campos obrigatórios ausentes: {', '.join(faltando)}")
+    return campos
+
+
+def montar_nota(arquivo: str, nfe: dict, chave: str = "") -> NotaFiscal:
+    """Converte o infNFe extraído no registro compacto usado no relatório."""
+    campos = ler_campos(nfe)
+    return NotaFiscal(
+        arquivo=arquivo,
+        cnpj_emit=campos["cnpj_emit"],
+        nome_emit=campos["nome_emit"],
+        total_nf_centavos=para_centavos(campos["v_nf"]),
+        icms_centavos=para_centavos(campos["v_icms"]),
+        # Dimensões dos agregados: mês AAAA-MM, UF do emitente, natureza da operação
+        mes=campos["data_emissao"][:7],
+        uf=campos["uf_emit"] or UF_POR_CODIGO.get(campos["c_uf"], ""),
+        nat_op=campos["nat_op"],
+        chave=chave,
+        data_emissao=campos["data_emissao"],
+        itens=tuple(
+            ItemNota(
+                n_item=int(item["n_item"]),
+                c_prod=item["c_prod"],
+                x_prod=item["x_prod"],
+                cfop=item["cfop"],
+                q_com=float(item["q_com"] or 0),
+                v_prod_centavos=para_centavos(item["v_prod"] or "0"),
+                icms_centavos=para_centavos(item["v_icms"] or "0"),
+            )
+            for item in extrair_itens(nfe)
+        ),
+    )
 
 
 app = FastAPI(title="FiscalIA Pro")
@@ -35,809 +126,605 @@ app.add_middleware(
     CORSMiddleware, allow_origins=["*"], allow_methods=["*"], allow_headers=["*"]
 )
 
-# Servir arquivos estáticos da pasta assets
-app.mount("/assets", StaticFiles(directory="assets"), name="assets")
+# Comprime as respostas grandes em JSON/texto (páginas e NDJSON de
+# `/lotes/{lote_id}/notas`); os estáticos já saem pré-comprimidos e passam
+# direto, e o q do Accept-Encoding é respeitado. Downloads ficam de fora: .xlsx e .parquet já são comprimidos, o
+# .arrow é para memory map (e aceita Range) e o PDF tem streams comprimidos
+app.add_middleware(
+    GZipNegociado,
+    minimum_size=1024,
+    compresslevel=6,
+    exclude_content_types=DEFAULT_EXCLUDED_CONTENT_TYPES
+    + (
+        "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+        "application/vnd.apache.parquet",
+        "application/vnd.apache.arrow.file",
+        "application/pdf",
+    ),
+)
+
+# Frontend (HTML/CSS/JS) e pasta assets carregados e comprimidos no startup
+catalogo = CatalogoEstatico("frontend", "assets")
 
 
 @app.get("/health")
 async def health():
-    return {"status": "🚀 FiscalIA Pro rodando!", "ok": True}
+    return {"status": "🚀 FiscalIA Pro rodando!", "ok": True, **controle_admissao.estado()}
+
+
+@app.exception_handler(LimiteExcedido)
+async def limite_excedido(request: Request, exc: LimiteExcedido):
+    print("REQUISIÇÃO RECUSADA:", str(exc))
+    headers = {"Retry-After": str(exc.retry_after)} if exc.retry_after else None
+    return JSONResponse(status_code=exc.status_code, content={"detail": str(exc)}, headers=headers)
+
+
+# Folga de 1 MB para os cabeçalhos e delimitadores do multipart
+app.add_middleware(LimiteCorpoRequisicao, max_bytes=MAX_BYTES_POR_REQUISICAO + 1024 * 1024)
+
+
+@app.middleware("http")
+async def observar_requisicao(request: Request, call_next):
+    """
+    Span raiz da requisição (com RASTREAMENTO ligado) e, com o perfilador
+    armado, amostragem das pilhas para as requisições acima do limiar.
+    """
+    descricao = f"{request.method} {request.url.path}"
+    amostragem = perfilador.iniciar(descricao)
+    inicio = time.perf_counter()
+    raiz = None
+    try:
+        with span(
+            descricao,
+            request.headers.get("traceparent"),
+            TIPO_SERVIDOR,
+            **{"http.method": request.method, "http.target": request.url.path},
+        ) as raiz:
+            resposta = await call_next(request)
+            if raiz is not None:
+                # Nome pela rota (/lotes/{lote_id}), não pelo caminho: agrupa as
+                # requisições da mesma etapa; sem rota (404), só o método
+                rota = request.scope.get("route")
+                if rota is not None:
+                    raiz.nome = f"{request.method} {rota.path}"
+                    raiz.atributos["http.route"] = rota.path
+                else:
+                    raiz.nome = request.method
+                raiz.atributos["http.status_code"] = resposta.status_code
+                if resposta.status_code >= 500:
+                    raiz.erro = f"HTTP {resposta.status_code}"
+                resposta.headers["traceparent"] = raiz.traceparent
+        return resposta
+    finally:
+        # Também quando a rota levanta exceção: a amostragem não fica ativa
+        if amostragem is not None:
+            perfilador.parar(amostragem)
+            duracao_ms = (time.perf_counter() - inicio) * 1000
+            trace_id = raiz.trace_id if raiz is not None else ""
+            await run_in_threadpool(perfilador.finalizar, amostragem, duracao_ms, trace_id)
+
+
+def caminho_relatorio(tenant: str, nome_arquivo: str) -> str:
+    """
+    Caminho de um relatório do tenant. Só aceita o nome do arquivo: um
+    tenant não alcança a pasta de outro (nem nada fora de relatorios/).
+    """
+    nome_arquivo = nome_arquivo.strip()
+    if not nome_arquivo or os.path.basename(nome_arquivo) != nome_arquivo or nome_arquivo.startswith("."):
+        raise HTTPException(status_code=404, detail=f"Arquivo não encontrado: {nome_arquivo}")
+    caminho = os.path.join(DIRETORIO_RELATORIOS, tenant, nome_arquivo)
+    if not os.path.isfile(caminho):
+        raise HTTPException(status_code=404, detail=f"Arquivo não encontrado: {nome_arquivo}")
+    return caminho
+
+
+def caminho_relatorio_excel(tenant: str, nome_arquivo: str) -> str:
+    """Como `caminho_relatorio`, só para o .xlsx (resumo e PDF leem a aba Relatorio)."""
+    if not nome_arquivo.strip().endswith(".xlsx"):
+        raise HTTPException(
+            status_code=400,
+            detail=f"Informe o relatório .xlsx, não {nome_arquivo} (o .parquet de notas "
+            "dele é lido automaticamente quando existe)",
+        )
+    return caminho_relatorio(tenant, nome_arquivo)
 
 
 @app.post("/processar-xml")
-async def processar_xml(file: UploadFile = File(...)):
+async def processar_xml(file: UploadFile = File(...), tenant: str = Depends(obter_tenant)):
     """Upload 1 XML → extrai CNPJ/total"""
+    async with admitir(tenant, validar_uploads([file])):
+        return await _processar_xml(file)
+
+
+async def _processar_xml(file: UploadFile) -> dict:
+    content = await ler_upload(file)
     try:
-        content = await file.read()
-        data = xmltodict.parse(content)
+        data = parse_xml_seguro(content)
         print("RAIZ KEYS:", list(data.keys()))
-        nfe = extrair_inf_nfe(data)
+        if eh_evento(data):
+            evento = extrair_evento(data)
+            return {
+                "ch_nfe": evento.ch_nfe,
+                "tp_evento": evento.tp_evento,
+                "descricao": evento.descricao,
+                "registrado": evento.registrado,
+            }
+        campos = ler_campos(extrair_inf_nfe(data))
 
         return {
-            "cnpj_emit": nfe["emit"]["CNPJ"],
-            "nome_emit": nfe["emit"]["xNome"],
-            "total_nf": float(nfe["total"]["ICMSTot"]["vNF"]),
-            "icms": float(nfe["total"]["ICMSTot"]["vICMS"]),
+            "cnpj_emit": campos["cnpj_emit"],
+            "nome_emit": campos["nome_emit"],
+            "total_nf": centavos_para_reais(para_centavos(campos["v_nf"])),
+            "icms": centavos_para_reais(para_centavos(campos["v_icms"])),
         }
+    except XMLRecusado as e:
+        print("XML RECUSADO:", str(e))
+        raise HTTPException(status_code=400, detail=f"XML recusado: {e}")
+    except LayoutNaoSuportado as e:
+        raise HTTPException(status_code=422, detail=str(e))
     except Exception as e:
         print("ERRO AO PROCESSAR XML:", repr(e))
         raise HTTPException(status_code=500, detail=f"Erro ao processar XML: {e}")
 
 
 @app.post("/processar-nfes")
-async def processar_nfes(files: List[UploadFile] = File(...)):
+async def processar_nfes(
+    files: List[UploadFile] = File(...), tenant: str = Depends(obter_tenant)
+):
     """
     Recebe vários XMLs, extrai dados, soma totais
     e gera um relatório Excel mais amigável.
+    Quantidade/tamanho dos arquivos são limitados e o lote só começa quando
+    há espaço no controle de admissão do tenant e do worker.
     """
-    resultados = []
-    total_geral = 0.0
-    total_icms = 0.0
-
-    for file in files:
-        try:
-            content = await file.read()
-            data = xmltodict.parse(content)
-            nfe = extrair_inf_nfe(data)
-
-            valor_nf = float(nfe["total"]["ICMSTot"]["vNF"])
-            valor_icms = float(nfe["total"]["ICMSTot"]["vICMS"])
-
-            total_geral += valor_nf
-            total_icms += valor_icms
-
-            resultados.append(
-                {
-                    "arquivo": file.filename,
-                    "cnpj_emit": nfe["emit"]["CNPJ"],
-                    "nome_emit": nfe["emit"]["xNome"],
-                    "total_nf": valor_nf,
-                    "icms": valor_icms,
-                }
-            )
-        except Exception as e:
-            print(f"ERRO NO ARQUIVO {file.filename}:", repr(e))
-            raise HTTPException(
-                status_code=500, detail=f"Erro ao processar XML {file.filename}: {e}"
+    async with admitir(tenant, validar_uploads(files)):
+        return await _processar_lote(tenant, files)
+
+
+async def _processar_lote(tenant: str, files: List[UploadFile]) -> dict:
+    notas = []
+    eventos = []
+
+    # Leitura e parse se alternam arquivo a arquivo: um span só, com o tempo
+    # de cada parte nos atributos
+    leitura_s = parse_s = 0.0
+    with span("ler_e_parsear_xml", arquivos=len(files)) as etapa:
+        for file in files:
+            inicio = time.perf_counter()
+            content = await ler_upload(file)
+            meio = time.perf_counter()
+            leitura_s += meio - inicio
+            try:
+                data = parse_xml_seguro(content)
+                if eh_evento(data):
+                    eventos.append(extrair_evento(data))
+                    continue
+                nfe = extrair_inf_nfe(data)
+                notas.append(montar_nota(file.filename, nfe, chave_da_nfe(nfe, data)))
+            except XMLRecusado as e:
+                print(f"XML RECUSADO {file.filename}:", str(e))
+                raise HTTPException(
+                    status_code=400, detail=f"XML {file.filename} recusado: {e}"
+                )
+            except LayoutNaoSuportado as e:
+                raise HTTPException(status_code=422, detail=f"{file.filename}: {e}")
+            except Exception as e:
+                print(f"ERRO NO ARQUIVO {file.filename}:", repr(e))
+                raise HTTPException(
+                    status_code=500, detail=f"Erro ao processar XML {file.filename}: {e}"
+                )
+            finally:
+                parse_s += time.perf_counter() - meio
+        if etapa is not None:
+            etapa.atributos.update(
+                notas=len(notas),
+                eventos=len(eventos),
+                leitura_ms=round(leitura_s * 1000, 1),
+                parse_ms=round(parse_s * 1000, 1),
             )
 
-    df = pd.DataFrame(resultados)
-    df = df.sort_values(by=["nome_emit", "total_nf"], ascending=[True, False])
+    # Eventos primeiro: um cancelamento estorna a nota se ela já foi somada
+    # em um lote anterior e a exclui se ela vier neste mesmo lote
+    # Cada tenant tem seu próprio índice de eventos e cubo de agregados; a
+    # primeira carga relê eventos e lotes do disco, então roda fora do event loop
+    indice_eventos = await run_in_threadpool(indices_eventos.__getitem__, tenant)
+    cubo = await run_in_threadpool(cubos.__getitem__, tenant)
+    cancelou = []
+    with span("aplicar_eventos", eventos=len(eventos)):
+        # Lida antes de filtrar: um cancelamento que chegue daqui até o lote
+        # ser salvo ainda é conciliado na leitura do lote
+        cancelamentos_vistos = indice_eventos.cancelamentos
+        for evento in eventos:
+            if indice_eventos.registrar(evento):
+                cancelou.append(evento.ch_nfe)
+        estornadas = [chave for chave in cancelou if cubo.contem(chave)]
+
+        canceladas = [n for n in notas if indice_eventos.cancelada(n.chave)]
+        notas = [n for n in notas if not indice_eventos.cancelada(n.chave)]
 
-    linha_total = {
-        "arquivo": "TOTAL",
-        "cnpj_emit": "",
-        "nome_emit": "",
-        "total_nf": total_geral,
-        "icms": total_icms,
+    try:
+        lote_id, resumo = await _gravar_lote(
+            tenant, notas, eventos, canceladas, estornadas, cancelamentos_vistos
+        )
+    finally:
+        # Os cancelamentos já estão gravados no índice de eventos: o estorno
+        # acompanha o índice mesmo se o lote falhar
+        for chave in cancelou:
+            cubo.remover(chave)
+
+    # O cubo só recebe as notas depois que o lote foi salvo: se o Excel, o
+    # Parquet ou a gravação falharem, ele continua batendo com os lotes em disco
+    with span("atualizar_agregados", notas=len(notas)):
+        cubo.registrar_lote(notas)
+    return {"lote_id": lote_id, **resumo}
+
+
+async def _gravar_lote(
+    tenant: str,
+    notas: List[NotaFiscal],
+    eventos: List[EventoNFe],
+    canceladas: List[NotaFiscal],
+    estornadas: List[str],
+    cancelamentos_vistos: int,
+):
+    """Excel, Parquet e lote em disco; retorna (lote_id, resumo)."""
+    # Totais somados em centavos inteiros: sem deriva de arredondamento
+    total_geral_centavos, total_icms_centavos = totais_centavos(notas)
+
+    # Sufixo aleatório: lotes no mesmo segundo não sobrescrevem o relatório um do outro
+    nome_arquivo = f"relatorio_nfes_{int(time.time())}_{uuid.uuid4().hex[:8]}.xlsx"
+    pasta = os.path.join(DIRETORIO_RELATORIOS, tenant)
+    os.makedirs(pasta, exist_ok=True)
+
+    # Pasta de trabalho com as abas Relatorio, Por Emitente e Itens; pandas só
+    # é carregado aqui, e a geração (CPU) roda fora do event loop
+    from relatorio_excel import RelatorioGrandeDemais, gerar_relatorio_excel
+
+    try:
+        await run_in_threadpool(gerar_relatorio_excel, os.path.join(pasta, nome_arquivo), notas)
+    except RelatorioGrandeDemais as e:
+        print("RELATÓRIO RECUSADO:", str(e))
+        raise HTTPException(
+            status_code=413,
+            detail=f"{e}. Divida o lote em partes menores; para volumes assim, leia as notas "
+            "pela saída Parquet/Arrow dos lotes (/lotes/{lote_id}/notas.arrow)",
+        )
+
+    # As mesmas notas em colunas tipadas para BI: Parquet ao lado do Excel e
+    # Arrow IPC no lote. Sem pyarrow, o lote segue só com Excel e NDJSON
+    tabelas = relatorios_parquet = None
+    if pyarrow_disponivel():
+        from colunar import gravar_parquet, montar_tabelas
+
+        tabelas = await run_in_threadpool(montar_tabelas, notas)
+        relatorios_parquet = await run_in_threadpool(gravar_parquet, pasta, nome_arquivo, tabelas)
+
+    resumo = {
+        "qtd": len(notas),
+        "total_geral": centavos_para_reais(total_geral_centavos),
+        "total_icms": centavos_para_reais(total_icms_centavos),
+        "total_geral_centavos": total_geral_centavos,
+        "total_icms_centavos": total_icms_centavos,
+        "relatorio_excel": nome_arquivo,
+        "relatorios_parquet": relatorios_parquet,
+        "eventos": len(eventos),
+        "canceladas": [{"arquivo": n.arquivo, "chave": n.chave} for n in canceladas],
+        "estornadas": estornadas,
     }
 
-    df = pd.concat([df, pd.DataFrame([linha_total])], ignore_index=True)
-    nome_arquivo = f"relatorio_nfes_{int(time.time())}.xlsx"
+    # As notas ficam no armazém de lotes, particionadas por CNPJ do emitente;
+    # a resposta leva só totais + lote_id. Elas são lidas depois por
+    # /lotes/{lote_id}/notas (paginado), .ndjson ou .arrow. A gravação é bloqueante
+    # (uma thread por partição): roda fora do event loop
+    lote_id = await run_in_threadpool(
+        armazem_lotes.salvar, tenant, notas, resumo, tabelas, cancelamentos_vistos
+    )
+    return lote_id, resumo
 
-    with pd.ExcelWriter(nome_arquivo, engine="openpyxl") as writer:
-        df.to_excel(writer, index=False, sheet_name="Relatorio")
-        workbook = writer.book
-        worksheet = writer.sheets["Relatorio"]
-        last_row = df.shape[0] + 1
 
-        from openpyxl.styles import Font
+@app.get("/lotes/{lote_id}")
+async def lote_resumo(lote_id: str, tenant: str = Depends(obter_tenant)):
+    # Leituras do lote vão ao disco (e podem conciliar o resumo com
+    # cancelamentos novos): fora do event loop, como a gravação
+    try:
+        return await run_in_threadpool(armazem_lotes.resumo, tenant, lote_id)
+    except LoteNaoEncontrado:
+        raise HTTPException(status_code=404, detail=f"Lote não encontrado: {lote_id}")
+
+
+@app.get("/lotes/{lote_id}/notas")
+async def lote_notas(
+    lote_id: str,
+    cursor: str = Query(""),
+    limite: int = Query(LIMITE_PAGINA_PADRAO, ge=1, le=LIMITE_PAGINA_MAXIMO),
+    cnpj_emit: Optional[str] = Query(None),
+    tenant: str = Depends(obter_tenant),
+):
+    """
+    Notas do lote, paginadas por cursor. Para a próxima página,
+    repita a chamada com `cursor=proximo_cursor` até ele vir null.
+    Com `cnpj_emit`, lê só a partição daquele emitente.
+    """
+    try:
+        notas, proximo_cursor = await run_in_threadpool(
+            armazem_lotes.pagina, tenant, lote_id, cursor, limite, cnpj_emit
+        )
+    except LoteNaoEncontrado:
+        raise HTTPException(status_code=404, detail=f"Lote não encontrado: {lote_id}")
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
-        for row in range(2, last_row + 1):
-            worksheet[f"D{row}"].number_format = "#,##0.00"
-            worksheet[f"E{row}"].number_format = "#,##0.00"
+    return {"lote_id": lote_id, "notas": notas, "proximo_cursor": proximo_cursor}
 
-        bold_font = Font(b=True)
-        for col in range(1, 6):
-            cell = worksheet.cell(row=last_row, column=col)
-            cell.font = bold_font
 
-    return {
-        "qtd": len(resultados),
-        "total_geral": total_geral,
-        "total_icms": total_icms,
-        "relatorio_excel": nome_arquivo,
-        "notas": resultados,
-    }
+@app.get("/lotes/{lote_id}/notas.ndjson")
+async def lote_notas_ndjson(
+    lote_id: str,
+    cnpj_emit: Optional[str] = Query(None),
+    tenant: str = Depends(obter_tenant),
+):
+    """Todas as notas do lote em NDJSON (uma por linha), transmitidas do disco."""
+    try:
+        await run_in_threadpool(armazem_lotes.resumo, tenant, lote_id)
+    except LoteNaoEncontrado:
+        raise HTTPException(status_code=404, detail=f"Lote não encontrado: {lote_id}")
 
+    return StreamingResponse(
+        armazem_lotes.blocos_ndjson(tenant, lote_id, cnpj_emit),
+        media_type="application/x-ndjson",
+    )
 
-@app.get("/download-relatorio")
-async def download_relatorio(nome_arquivo: str):
+
+# Arquivos para download (relatórios e tabelas dos lotes), pela extensão
+TIPOS_DOWNLOAD = {
+    ".xlsx": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+    ".parquet": "application/vnd.apache.parquet",
+    ".arrow": "application/vnd.apache.arrow.file",
+}
+
+
+@app.get("/lotes/{lote_id}/{tabela}.arrow")
+async def lote_arrow(lote_id: str, tabela: str, tenant: str = Depends(obter_tenant)):
     """
-    Faz o download do arquivo Excel gerado.
+    Notas ou itens do lote em Arrow IPC (arquivo), com os tipos do registro:
+    `pyarrow.ipc.open_file(pyarrow.memory_map(...))`, `pl.read_ipc` ou DuckDB.
     """
+    if tabela not in TABELAS:
+        raise HTTPException(status_code=404, detail=f"Tabela desconhecida: {tabela}")
     try:
-        return FileResponse(
-            path=nome_arquivo,
-            media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-            filename=nome_arquivo,
-            headers={"Content-Disposition": f"attachment; filename={nome_arquivo}"},
-        )
-    except Exception as e:
-        print("ERRO AO ENVIAR EXCEL:", repr(e))
+        caminho = await run_in_threadpool(armazem_lotes.caminho_colunar, tenant, lote_id, tabela)
+    except LoteNaoEncontrado:
         raise HTTPException(
-            status_code=404, detail=f"Arquivo não encontrado: {nome_arquivo}"
+            status_code=404, detail=f"Lote sem saída colunar (pyarrow ausente?): {lote_id}"
         )
+    return FileResponse(
+        caminho, media_type=TIPOS_DOWNLOAD[".arrow"], filename=f"{lote_id}_{tabela}.arrow"
+    )
+
+
+@app.get("/download-relatorio")
+async def download_relatorio(nome_arquivo: str, tenant: str = Depends(obter_tenant)):
+    """
+    Faz o download do relatório gerado: o Excel ou um dos .parquet
+    (`relatorios_parquet` na resposta de /processar-nfes).
+    """
+    nome_arquivo = nome_arquivo.strip()
+    tipo = TIPOS_DOWNLOAD.get(os.path.splitext(nome_arquivo)[1])
+    if tipo is None:
+        raise HTTPException(status_code=404, detail=f"Relatório não encontrado: {nome_arquivo}")
+    return FileResponse(
+        path=caminho_relatorio(tenant, nome_arquivo),
+        media_type=tipo,
+        filename=nome_arquivo,
+        headers={"Content-Disposition": f"attachment; filename={nome_arquivo}"},
+    )
+
+
+def _ler_relatorio(nome_arquivo: str):
+    import pandas as pd
+
+    return pd.read_excel(nome_arquivo, sheet_name="Relatorio")
+
+
+def _parquet_do_relatorio(caminho_excel: str) -> Optional[str]:
+    """Parquet de notas gravado junto com o Excel, se houver (e pyarrow)."""
+    from colunar import nomes_parquet
+
+    caminho = os.path.join(
+        os.path.dirname(caminho_excel), nomes_parquet(os.path.basename(caminho_excel))["notas"]
+    )
+    if caminho_excel.endswith(".xlsx") and os.path.exists(caminho) and pyarrow_disponivel():
+        return caminho
+    return None
+
+
+def _erro_limite_llm(e: Exception) -> HTTPException:
+    """Repassa o 429 do provedor de LLM para o cliente, com Retry-After."""
+    resposta = getattr(e, "response", None)
+    retry_after = resposta.headers.get("retry-after") if resposta is not None else None
+    return HTTPException(
+        status_code=429,
+        detail="Limite de requisições do serviço de IA atingido, tente novamente",
+        headers={"Retry-After": retry_after} if retry_after else None,
+    )
+
+
+@rastreado("resumo_ia.montar_prompt")
+def _mensagens_resumo(tenant: str, nome_arquivo: Optional[str], lote_id: Optional[str]):
+    """
+    Prompt do resumo. Com `lote_id` usa os totais por emitente já gravados
+    nas partições do lote (sem abrir o Excel nem carregar pandas); senão,
+    lê o relatório `nome_arquivo` do tenant (o .parquet dele, se houver).
+    """
+    from ia_agente import mensagens_do_lote, montar_mensagens
+
+    if lote_id:
+        try:
+            return mensagens_do_lote(armazem_lotes.particoes(tenant, lote_id))
+        except LoteNaoEncontrado:
+            raise HTTPException(status_code=404, detail=f"Lote não encontrado: {lote_id}")
+    if not nome_arquivo:
+        raise HTTPException(status_code=400, detail="Informe nome_arquivo ou lote_id")
+    caminho = caminho_relatorio_excel(tenant, nome_arquivo)
+
+    # Com o .parquet do relatório, soma as colunas por memory map em vez de
+    # abrir o Excel; o prompt sai igual
+    parquet = _parquet_do_relatorio(caminho)
+    if parquet is not None:
+        from colunar import ler_tabela, totais_por_emitente
+        from ia_agente import montar_mensagens_de_agregados
+
+        tabela = ler_tabela(parquet, ["nome_emit", "total_nf_centavos", "icms_centavos"])
+        return montar_mensagens_de_agregados(totais_por_emitente(tabela))
+    return montar_mensagens(_ler_relatorio(caminho))
+
+
+@rastreado("resumo_ia")
+def _gerar_resumo(tenant: str, nome_arquivo: Optional[str], lote_id: Optional[str]) -> str:
+    from ia_agente import gerar_resumo
+
+    return gerar_resumo(_mensagens_resumo(tenant, nome_arquivo, lote_id))
+
+
+@rastreado("resumo_ia.stream")
+def _abrir_resumo_stream(tenant: str, nome_arquivo: Optional[str], lote_id: Optional[str]):
+    from ia_agente import gerar_resumo_stream
+
+    return gerar_resumo_stream(_mensagens_resumo(tenant, nome_arquivo, lote_id))
 
 
 @app.get("/resumo-ia")
-async def resumo_ia(nome_arquivo: str):
-    df = pd.read_excel(nome_arquivo)
-    texto = gerar_resumo_nf(df)
+async def resumo_ia(
+    nome_arquivo: Optional[str] = None,
+    lote_id: Optional[str] = None,
+    tenant: str = Depends(obter_tenant),
+):
+    # Leitura do Excel e chamada ao LLM são bloqueantes: rodam no threadpool
+    # para não travar o event loop com vários usuários ao mesmo tempo
+    try:
+        texto = await run_in_threadpool(_gerar_resumo, tenant, nome_arquivo, lote_id)
+    except Exception as e:
+        if getattr(e, "status_code", None) == 429 and not isinstance(e, HTTPException):
+            raise _erro_limite_llm(e)
+        raise
     return {"resumo": texto}
 
 
-@app.get("/", response_class=HTMLResponse)
-async def home():
-    return """
-    <!DOCTYPE html>
-    <html lang="pt-BR">
-      <head>
-        <meta charset="utf-8" />
-        <meta name="viewport" content="width=device-width, initial-scale=1.0">
-        <link rel="icon" type="image/x-icon" href="/assets/logoai.ico">
-        <title>FiscalIA Pro</title>
-        <style>
-          * {
-            margin: 0;
-            padding: 0;
-            box-sizing: border-box;
-          }
-
-          body {
-            font-family: -apple-system, BlinkMacSystemFont, 'Segoe UI', sans-serif;
-            background: #000;
-            color: #fff;
-            overflow-x: hidden;
-          }
-
-          nav {
-            position: fixed;
-            top: 0;
-            height: 80px;
-            width: 100%;
-            padding: 20px 40px;
-            display: flex;
-            justify-content: space-between;
-            align-items: center;
-            background: rgba(0,0,0,0.9);
-            backdrop-filter: blur(10px);
-            z-index: 1000;
-            border-bottom: 1px solid rgba(198,255,0,0.2);
-          }
-          
-          .logo img {
-            height: 80px;              /* normaliza o tamanho */
-            width: auto;
-            }
+@app.get("/resumo-ia/stream")
+async def resumo_ia_stream(
+    nome_arquivo: Optional[str] = None,
+    lote_id: Optional[str] = None,
+    tenant: str = Depends(obter_tenant),
+):
+    """
+    Mesmo resumo de /resumo-ia, enviado em texto puro à medida que é gerado.
+    A chamada ao provedor é aberta (e o primeiro pedaço lido) antes da
+    resposta: um 429 ou falha do provedor sai com o status certo, não como
+    conexão cortada depois do 200.
+    """
+    try:
+        partes = await run_in_threadpool(_abrir_resumo_stream, tenant, nome_arquivo, lote_id)
+    except Exception as e:
+        if getattr(e, "status_code", None) == 429 and not isinstance(e, HTTPException):
+            raise _erro_limite_llm(e)
+        raise
+    return StreamingResponse(partes, media_type="text/plain; charset=utf-8")
 
-          .logo:hover {
-            opacity: 0.8;
-          }
-
-          .nav-info {
-            font-size: 14px;
-            color: #888;
-            text-transform: uppercase;
-            letter-spacing: 1px;
-          }
-
-          .hero {
-            min-height: 100vh;
-            display: flex;
-            flex-direction: column;
-            justify-content: center;
-            align-items: center;
-            padding: 100px 40px 60px;
-            background: linear-gradient(135deg, #000 0%, #1a1a1a 100%);
-            position: relative;
-            overflow: hidden;
-          }
-
-          .hero-bg {
-            position: absolute;
-            width: 100%;
-            height: 100%;
-            background: 
-                radial-gradient(circle at 20% 50%, rgba(198,255,0,0.1) 0%, transparent 50%),
-                radial-gradient(circle at 80% 80%, rgba(198,255,0,0.05) 0%, transparent 50%);
-          }
-
-          .hero-content {
-            position: relative;
-            z-index: 1;
-            text-align: center;
-            max-width: 1200px;
-            width: 100%;
-          }
-
-          .hero h1 {
-            font-size: 80px;
-            font-weight: 900;
-            margin-bottom: 10px;
-            background: linear-gradient(90deg, #fff 0%, #c6ff00 100%);
-            -webkit-background-clip: text;
-            -webkit-text-fill-color: transparent;
-            animation: fadeInUp 1s ease;
-          }
-
-          .hero .subtitle {
-            font-size: 18px;
-            color: #888;
-            margin-bottom: 60px;
-            text-transform: uppercase;
-            letter-spacing: 3px;
-            animation: fadeInUp 1.2s ease;
-          }
-
-          .upload-container {
-            width: 100%;
-            max-width: 900px;
-            margin: 40px auto;
-            animation: fadeInUp 1.4s ease;
-          }
-
-          .upload-area {
-            border: 3px solid rgba(198,255,0,0.3);
-            padding: 80px 40px;
-            text-align: center;
-            background: rgba(198,255,0,0.02);
-            transition: all 0.3s ease;
-            cursor: pointer;
-            position: relative;
-          }
-
-          .upload-area:hover {
-            border-color: #c6ff00;
-            background: rgba(198,255,0,0.05);
-          }
-
-          .upload-area.dragover {
-            border-color: #c6ff00;
-            background: rgba(198,255,0,0.1);
-            transform: scale(1.01);
-          }
-
-          .upload-icon {
-            font-size: 80px;
-            margin-bottom: 20px;
-            filter: grayscale(100%);
-            opacity: 0.6;
-            transition: all 0.3s;
-          }
-
-          .upload-area:hover .upload-icon {
-            filter: grayscale(0%);
-            opacity: 1;
-          }
-
-          .upload-text {
-            font-size: 24px;
-            color: #fff;
-            margin-bottom: 10px;
-            font-weight: 700;
-            text-transform: uppercase;
-            letter-spacing: 2px;
-          }
-
-          .upload-subtext {
-            font-size: 14px;
-            color: #888;
-            text-transform: uppercase;
-            letter-spacing: 1px;
-          }
-
-          input[type="file"] {
-            display: none;
-          }
-
-          .file-list {
-            margin-top: 30px;
-            padding: 0;
-          }
-
-          .file-item {
-            display: flex;
-            align-items: center;
-            justify-content: space-between;
-            padding: 20px;
-            background: rgba(255,255,255,0.02);
-            border: 1px solid rgba(198,255,0,0.2);
-            margin-bottom: 10px;
-            transition: all 0.3s;
-          }
-
-          .file-item:hover {
-            background: rgba(198,255,0,0.05);
-            border-color: #c6ff00;
-          }
-
-          .file-name {
-            color: #fff;
-            font-size: 14px;
-            flex: 1;
-            text-transform: uppercase;
-            letter-spacing: 1px;
-          }
-
-          .file-size {
-            color: #888;
-            font-size: 12px;
-            margin-right: 20px;
-            text-transform: uppercase;
-          }
-
-          .remove-file {
-            background: transparent;
-            color: #c6ff00;
-            border: 1px solid #c6ff00;
-            padding: 8px 16px;
-            cursor: pointer;
-            font-size: 12px;
-            text-transform: uppercase;
-            letter-spacing: 1px;
-            transition: all 0.3s;
-          }
-
-          .remove-file:hover {
-            background: #c6ff00;
-            color: #000;
-          }
-
-          .btn {
-            width: 100%;
-            padding: 24px;
-            font-size: 16px;
-            font-weight: 700;
-            border: 2px solid #c6ff00;
-            background: transparent;
-            color: #c6ff00;
-            cursor: pointer;
-            transition: all 0.3s ease;
-            margin-top: 30px;
-            text-transform: uppercase;
-            letter-spacing: 2px;
-          }
-
-          .btn:hover:not(:disabled) {
-            background: #c6ff00;
-            color: #000;
-            transform: translateY(-2px);
-          }
-
-          .btn:disabled {
-            opacity: 0.3;
-            cursor: not-allowed;
-            border-color: #444;
-            color: #444;
-          }
-
-          .btn-secondary {
-            background: transparent;
-            border: 2px solid #fff;
-            color: #fff;
-          }
-
-          .btn-secondary:hover {
-            background: #fff;
-            color: #000;
-          }
-
-          .loading {
-            display: none;
-            text-align: center;
-            padding: 60px 20px;
-          }
-
-          .loading.active {
-            display: block;
-          }
-
-          .spinner {
-            border: 3px solid rgba(198,255,0,0.1);
-            border-top: 3px solid #c6ff00;
-            border-radius: 50%;
-            width: 60px;
-            height: 60px;
-            animation: spin 1s linear infinite;
-            margin: 0 auto 20px;
-          }
-
-          .loading-text {
-            color: #888;
-            text-transform: uppercase;
-            letter-spacing: 2px;
-            font-size: 14px;
-          }
-
-          .resultado-section {
-            max-width: 1200px;
-            margin: 60px auto;
-            padding: 0 40px;
-          }
-
-          .resultado-card {
-            background: rgba(255,255,255,0.02);
-            border: 1px solid rgba(198,255,0,0.2);
-            padding: 60px 40px;
-            animation: slideIn 0.5s ease;
-          }
-
-          .resultado-title {
-            font-size: 36px;
-            font-weight: 900;
-            color: #c6ff00;
-            margin-bottom: 40px;
-            text-transform: uppercase;
-            letter-spacing: 2px;
-          }
-
-          .stats-grid {
-            display: grid;
-            grid-template-columns: repeat(3, 1fr);
-            gap: 30px;
-            margin-bottom: 40px;
-          }
-
-          .stat-item {
-            text-align: center;
-            padding: 40px 20px;
-            background: rgba(198,255,0,0.02);
-            border: 1px solid rgba(198,255,0,0.2);
-            transition: all 0.3s;
-          }
-
-          .stat-item:hover {
-            background: rgba(198,255,0,0.05);
-            border-color: #c6ff00;
-            transform: translateY(-5px);
-          }
-
-          .stat-label {
-            font-size: 12px;
-            text-transform: uppercase;
-            color: #888;
-            margin-bottom: 15px;
-            letter-spacing: 2px;
-          }
-
-          .stat-value {
-            font-size: 42px;
-            font-weight: 900;
-            color: #c6ff00;
-          }
-
-          .action-buttons {
-            display: grid;
-            grid-template-columns: 1fr 1fr;
-            gap: 20px;
-            margin-top: 40px;
-          }
-
-          .btn-download {
-            background: transparent;
-            border: 2px solid #c6ff00;
-            color: #c6ff00;
-            padding: 20px;
-            text-decoration: none;
-            display: block;
-            text-align: center;
-            font-weight: 700;
-            text-transform: uppercase;
-            letter-spacing: 2px;
-            transition: all 0.3s;
-          }
-
-          .btn-download:hover {
-            background: #c6ff00;
-            color: #000;
-            transform: translateY(-2px);
-          }
-
-          .resumo-ia-card {
-            margin-top: 60px;
-            padding: 60px 40px;
-            background: rgba(255,255,255,0.02);
-            border: 1px solid rgba(198,255,0,0.2);
-            animation: slideIn 0.5s ease;
-          }
-
-          .resumo-ia-card h3 {
-            color: #c6ff00;
-            margin-bottom: 30px;
-            font-size: 36px;
-            font-weight: 900;
-            text-transform: uppercase;
-            letter-spacing: 2px;
-          }
-
-          .resumo-ia-card pre {
-            white-space: pre-wrap;
-            word-wrap: break-word;
-            line-height: 1.8;
-            color: #aaa;
-            font-family: inherit;
-            font-size: 16px;
-          }
-
-          .hidden {
-            display: none;
-          }
-
-          @keyframes spin {
-            0% { transform: rotate(0deg); }
-            100% { transform: rotate(360deg); }
-          }
-
-          @keyframes fadeInUp {
-            from {
-              opacity: 0;
-              transform: translateY(30px);
-            }
-            to {
-              opacity: 1;
-              transform: translateY(0);
-            }
-          }
 
-          @keyframes slideIn {
-            from {
-              opacity: 0;
-              transform: translateX(-20px);
-            }
-            to {
-              opacity: 1;
-              transform: translateX(0);
-            }
-          }
+@app.get("/resumo-ia/estatisticas")
+async def resumo_ia_estatisticas():
+    """Acertos/faltas do cache de respostas do LLM (usado no teste de carga)."""
+    return cache_respostas.estatisticas()
 
-          @media (max-width: 768px) {
-            .hero h1 {
-              font-size: 48px;
-            }
 
-            nav {
-              padding: 15px 20px;
+@app.get("/status-nfe/{chave}")
+async def status_nfe(chave: str, tenant: str = Depends(obter_tenant)):
+    """Status da nota (autorizada/cancelada) conforme os eventos já recebidos."""
+    indice_eventos = await run_in_threadpool(indices_eventos.obter, tenant) or IndiceEventos()
+    return {
+        "chave": chave,
+        "status": indice_eventos.status(chave),
+        "eventos": [
+            {
+                "tp_evento": e.tp_evento,
+                "n_seq_evento": e.n_seq_evento,
+                "dh_evento": e.dh_evento,
+                "descricao": e.descricao,
+                "registrado": e.registrado,
             }
+            for e in indice_eventos.eventos(chave)
+        ],
+    }
 
-            .logo {
-              font-size: 20px;
-            }
 
-            .nav-info {
-              display: none;
-            }
+@app.get("/agregados/{dimensao}")
+async def agregados(
+    dimensao: str,
+    cnpj_emit: Optional[str] = Query(None),
+    mes: Optional[str] = Query(None),
+    uf: Optional[str] = Query(None),
+    nat_op: Optional[str] = Query(None),
+    tenant: str = Depends(obter_tenant),
+):
+    """
+    Drill-down nos agregados já materializados:
+    /agregados/uf?mes=2024-01 → totais por UF no mês informado.
+    """
+    filtros = {"cnpj_emit": cnpj_emit, "mes": mes, "uf": uf, "nat_op": nat_op}
+    try:
+        cubo = await run_in_threadpool(cubos.obter, tenant) or CuboAgregados()
+        linhas = cubo.consultar(dimensao, filtros)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
-            .upload-area {
-              padding: 60px 20px;
-            }
+    return {
+        "dimensao": dimensao,
+        "filtros": {k: v for k, v in filtros.items() if v is not None},
+        "linhas": linhas,
+    }
 
-            .stats-grid {
-              grid-template-columns: 1fr;
-              gap: 15px;
-            }
 
-            .action-buttons {
-              grid-template-columns: 1fr;
-            }
+@app.get("/agregados")
+async def agregados_totais(tenant: str = Depends(obter_tenant)):
+    cubo = await run_in_threadpool(cubos.obter, tenant) or CuboAgregados()
+    return cubo.totais()
 
-            .resultado-card,
-            .resumo-ia-card {
-              padding: 40px 20px;
-            }
-          }
-        </style>
-      </head>
-      <body>
-        <nav>
-            <a href="/" class="logo">
-            <img src="/assets/logoai.png" alt="Fiscal IA Pro">
-            </a>
-          <div class="nav-info">Análise Inteligente</div>
-        </nav>
-
-        <section class="hero">
-          <div class="hero-bg"></div>
-          <div class="hero-content">
-            <h1>FISCAL IA PRO</h1>
-            <div class="subtitle">Relatório de NF-e com IA </div>
-
-            <div class="upload-container">
-              <form id="form-nfes" enctype="multipart/form-data">
-                <div class="upload-area" id="upload-area" onclick="document.getElementById('file-input').click()">
-                  <div class="upload-icon">📁</div>
-                  <div class="upload-text">Carregar Arquivos XML</div>
-                  <div class="upload-subtext">Arraste ou clique para selecionar</div>
-                  <input id="file-input" name="files" type="file" multiple accept=".xml" />
-                </div>
-
-                <div id="file-list" class="file-list hidden"></div>
-
-                <button type="button" class="btn" id="btn-processar" onclick="enviar()" disabled>
-                  Gerar Relatório
-                </button>
-              </form>
-            </div>
-
-            <div class="loading" id="loading">
-              <div class="spinner"></div>
-              <div class="loading-text">Processando...</div>
-            </div>
-          </div>
-        </section>
-
-        <div class="resultado-section">
-          <div id="resultado" class="hidden"></div>
-          <div id="resumo-ia" class="hidden"></div>
-        </div>
-
-        <script>
-        let selectedFiles = [];
-
-        const uploadArea = document.getElementById('upload-area');
-        const fileInput = document.getElementById('file-input');
-        const fileList = document.getElementById('file-list');
-        const btnProcessar = document.getElementById('btn-processar');
-
-        uploadArea.addEventListener('dragover', (e) => {
-          e.preventDefault();
-          uploadArea.classList.add('dragover');
-        });
-
-        uploadArea.addEventListener('dragleave', () => {
-          uploadArea.classList.remove('dragover');
-        });
-
-        uploadArea.addEventListener('drop', (e) => {
-          e.preventDefault();
-          uploadArea.classList.remove('dragover');
-          const files = Array.from(e.dataTransfer.files);
-          handleFiles(files);
-        });
-
-        fileInput.addEventListener('change', (e) => {
-          const files = Array.from(e.target.files);
-          handleFiles(files);
-        });
-
-        function handleFiles(files) {
-          selectedFiles = files.filter(f => f.name.endsWith('.xml'));
-          
-          if (selectedFiles.length === 0) {
-            alert('Por favor, selecione apenas arquivos XML.');
-            return;
-          }
-
-          renderFileList();
-          btnProcessar.disabled = false;
-        }
 
-        function renderFileList() {
-          if (selectedFiles.length === 0) {
-            fileList.classList.add('hidden');
-            btnProcessar.disabled = true;
-            return;
-          }
-
-          fileList.classList.remove('hidden');
-          fileList.innerHTML = selectedFiles.map((file, index) => `
-            <div class="file-item">
-              <span class="file-name">📄 ${file.name}</span>
-              <span class="file-size">${(file.size / 1024).toFixed(1)} KB</span>
-              <button type="button" class="remove-file" onclick="removeFile(${index})">Remover</button>
-            </div>
-          `).join('');
-        }
+@app.get("/static/{versao}/{nome}")
+async def estatico(request: Request, versao: str, nome: str):
+    """
+    Frontend e assets versionados pelo hash do conteúdo: a URL muda quando o
+    arquivo muda, então o navegador pode guardar a resposta para sempre.
+    """
+    arquivo = catalogo.arquivos.get(nome)
+    if arquivo is None:
+        raise HTTPException(status_code=404, detail=f"Arquivo não encontrado: {nome}")
+    cache_control = CACHE_IMUTAVEL if versao == arquivo.versao else CACHE_REVALIDAR
+    return catalogo.responder(request, arquivo, cache_control)
 
-        function removeFile(index) {
-          selectedFiles.splice(index, 1);
-          renderFileList();
-        }
 
-        async function enviar() {
-          const form = document.getElementById('form-nfes');
-          const formData = new FormData();
-          
-          selectedFiles.forEach(file => {
-            formData.append('files', file);
-          });
-
-          document.getElementById('loading').classList.add('active');
-          document.getElementById('resultado').classList.add('hidden');
-          document.getElementById('resumo-ia').classList.add('hidden');
-          btnProcessar.disabled = true;
-
-          try {
-            const resp = await fetch('/processar-nfes', {
-              method: 'POST',
-              body: formData
-            });
-
-            const data = await resp.json();
-
-            if (resp.ok) {
-              mostrarResultado(data);
-            } else {
-              alert('Erro: ' + (data.detail || 'erro ao processar'));
-            }
-          } catch (error) {
-            alert('Erro de conexão: ' + error.message);
-          } finally {
-            document.getElementById('loading').classList.remove('active');
-            btnProcessar.disabled = false;
-          }
-        }
+@app.get("/assets/{nome}")
+async def assets(request: Request, nome: str):
+    """URLs antigas de /assets, sem versão: cache curto + ETag."""
+    arquivo = catalogo.arquivos.get(nome)
+    if arquivo is None:
+        raise HTTPException(status_code=404, detail=f"Arquivo não encontrado: {nome}")
+    return catalogo.responder(request, arquivo, CACHE_ASSETS)
 
-        function mostrarResultado(data) {
-          const div = document.getElementById('resultado');
-          div.classList.remove('hidden');
-          
-          div.innerHTML = `
-            <div class="resultado-card">
-              <h2 class="resultado-title">Resultado</h2>
-              
-              <div class="stats-grid">
-                <div class="stat-item">
-                  <div class="stat-label">Notas Processadas</div>
-                  <div class="stat-value">${data.qtd}</div>
-                </div>
-                <div class="stat-item">
-                  <div class="stat-label">Total Geral</div>
-                  <div class="stat-value">R$ ${data.total_geral.toFixed(2)}</div>
-                </div>
-                <div class="stat-item">
-                  <div class="stat-label">Total ICMS</div>
-                  <div class="stat-value">R$ ${data.total_icms.toFixed(2)}</div>
-                </div>
-              </div>
-
-              <div class="action-buttons">
-                <a href="/download-relatorio?nome_arquivo=${encodeURIComponent(data.relatorio_excel)}" class="btn-download">
-                  Baixar Excel
-                </a>
-                <button type="button" class="btn btn-secondary" onclick="gerarResumoIA('${data.relatorio_excel}')">
-                  Gerar Resumo IA
-                </button>
-              </div>
-            </div>
-          `;
-        }
 
-        async function gerarResumoIA(nomeArquivo) {
-          document.getElementById('loading').classList.add('active');
-          
-          try {
-            const resp = await fetch('/resumo-ia?nome_arquivo=' + encodeURIComponent(nomeArquivo));
-            const data = await resp.json();
-
-            if (resp.ok) {
-              const resumoDiv = document.getElementById('resumo-ia');
-              resumoDiv.classList.remove('hidden');
-              resumoDiv.innerHTML = `
-                <div class="resumo-ia-card">
-                  <h3>Análise IA</h3>
-                  <pre>${data.resumo}</pre>
-                </div>
-              `;
-            } else {
-              alert('Erro IA: ' + (data.detail || 'erro ao gerar resumo'));
-            }
-          } catch (error) {
-            alert('Erro ao gerar resumo: ' + error.message);
-          } finally {
-            document.getElementById('loading').classList.remove('active');
-          }
-        }
-        </script>
-      </body>
-    </html>
-    """
+@app.get("/", response_class=HTMLResponse)
+async def home(request: Request):
+    # Sempre revalida (ETag → 304); CSS/JS/imagens vêm das URLs versionadas
+    return catalogo.responder(request, catalogo.pagina_inicial, CACHE_REVALIDAR)
 
 
 @app.get("/gerar-relatorio-pdf")
-async def relatorio_pdf(nome_arquivo: str):
-    nome_arquivo = nome_arquivo.strip()
-    caminho_pdf = gerar_relatorio_pdf(nome_arquivo)
+async def relatorio_pdf(nome_arquivo: str, tenant: str = Depends(obter_tenant)):
+    from gerar_relatorio_pdf import gerar_relatorio_pdf
+
+    caminho_pdf = await run_in_threadpool(
+        gerar_relatorio_pdf, caminho_relatorio_excel(tenant, nome_arquivo)
+    )
     return FileResponse(
         caminho_pdf,
         media_type="application/pdf",
@@ -845,6 +732,40 @@ async def relatorio_pdf(nome_arquivo: str):
     )
 
 
+@app.get("/admin/perfilador", dependencies=[Depends(exigir_admin)])
+async def perfilador_estado():
+    return {**perfilador.estado(), "perfis": perfilador.perfis()}
+
+
+@app.post("/admin/perfilador", dependencies=[Depends(exigir_admin)])
+async def perfilador_armar(
+    limiar_ms: int = Query(1000, ge=0),
+    duracao_s: int = Query(600, ge=1, le=DURACAO_MAXIMA_S),
+    intervalo_ms: int = Query(10, ge=1, le=1000),
+):
+    """
+    Arma o perfilador por `duracao_s`: requisições acima de `limiar_ms`
+    deixam um perfil (pilhas no formato folded) em /admin/perfis/{nome}.
+    """
+    return perfilador.armar(limiar_ms, duracao_s, intervalo_ms)
+
+
+@app.delete("/admin/perfilador", dependencies=[Depends(exigir_admin)])
+async def perfilador_desarmar():
+    return perfilador.desarmar()
+
+
+@app.get("/admin/perfis/{nome}", dependencies=[Depends(exigir_admin)])
+async def perfil(nome: str):
+    """Pilhas amostradas de uma requisição lenta, para flamegraph.pl/inferno/speedscope."""
+    try:
+        caminho = perfilador.caminho(nome)
+    except KeyError:
+        raise HTTPException(status_code=404, detail=f"Perfil não encontrado: {nome}")
+    with open(caminho, encoding="utf-8") as f:
+        return PlainTextResponse(f.read())
+
+
 if __name__ == "__main__":
     import uvicorn
 
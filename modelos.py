@@ -0,0 +1,109 @@
+# modelos.py
+
+from dataclasses import dataclass
+from typing import List, Sequence, Tuple
+
+from dinheiro import array_centavos, centavos_para_reais, somar_centavos
+
+# Colunas do relatório, na ordem em que vão para o Excel
+COLUNAS_RELATORIO = (
+    "arquivo",
+    "cnpj_emit",
+    "nome_emit",
+    "total_nf",
+    "icms",
+    "mes",
+    "uf",
+    "nat_op",
+)
+
+
+@dataclass(slots=True)
+class ItemNota:
+    """Item (det) de uma NF-e; valores monetários em centavos."""
+
+    n_item: int
+    c_prod: str
+    x_prod: str
+    cfop: str
+    q_com: float
+    v_prod_centavos: int
+    icms_centavos: int
+
+
+@dataclass(slots=True)
+class NotaFiscal:
+    """Registro compacto de uma NF-e extraída; valores monetários em centavos."""
+
+    arquivo: str
+    cnpj_emit: str
+    nome_emit: str
+    total_nf_centavos: int
+    icms_centavos: int
+    mes: str = ""
+    uf: str = ""
+    nat_op: str = ""
+    chave: str = ""
+    # dhEmi/dEmi como veio no XML (ISO 8601); `mes` é derivado dela
+    data_emissao: str = ""
+    itens: Tuple[ItemNota, ...] = ()
+
+    @property
+    def total_nf(self) -> float:
+        return centavos_para_reais(self.total_nf_centavos)
+
+    @property
+    def icms(self) -> float:
+        return centavos_para_reais(self.icms_centavos)
+
+    def como_dict(self) -> dict:
+        dados = {coluna: getattr(self, coluna) for coluna in COLUNAS_RELATORIO}
+        dados["chave"] = self.chave
+        # Valores exatos, para quem relê o lote (ex.: o cubo após um restart)
+        dados["total_nf_centavos"] = self.total_nf_centavos
+        dados["icms_centavos"] = self.icms_centavos
+        return dados
+
+
+def ordenar_notas(notas: List[NotaFiscal]) -> List[NotaFiscal]:
+    """Mesma ordem do relatório: emitente A→Z e, dentro dele, maior valor primeiro."""
+    return sorted(notas, key=lambda n: (n.nome_emit, -n.total_nf_centavos))
+
+
+def totais_centavos(notas: Sequence[NotaFiscal]) -> Tuple[int, int]:
+    """
+    (total_nf, icms) do lote em centavos. Os registros são objetos Python:
+    `sum()` de inteiros é exato e mais rápido que montar um array NumPy só
+    para somá-lo (ver bench_dinheiro.py).
+    """
+    return sum(n.total_nf_centavos for n in notas), sum(n.icms_centavos for n in notas)
+
+
+def notas_para_colunas(notas: Sequence[NotaFiscal], com_total: bool = True) -> dict:
+    """
+    Monta as colunas do relatório direto dos registros, prontas para
+    `pd.DataFrame(colunas)`. Os valores monetários vêm de arrays int64 de
+    centavos e a linha TOTAL é a soma exata desses arrays.
+    """
+    import numpy as np
+
+    quantidade = len(notas)
+    total = array_centavos((n.total_nf_centavos for n in notas), quantidade)
+    icms = array_centavos((n.icms_centavos for n in notas), quantidade)
+
+    colunas = {
+        coluna: [getattr(n, coluna) for n in notas]
+        for coluna in COLUNAS_RELATORIO
+        if coluna not in ("total_nf", "icms")
+    }
+
+    if com_total:
+        for coluna in ("cnpj_emit", "nome_emit", "mes", "uf", "nat_op"):
+            colunas[coluna].append("")
+        colunas["arquivo"].append("TOTAL")
+        total = np.append(total, somar_centavos(total))
+        icms = np.append(icms, somar_centavos(icms))
+
+    colunas["total_nf"] = centavos_para_reais(total)
+    colunas["icms"] = centavos_para_reais(icms)
+    return {coluna: colunas[coluna] for coluna in COLUNAS_RELATORIO}
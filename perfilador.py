@@ -0,0 +1,227 @@
+# perfilador.py
+"""
+Perfilador por amostragem, ligado por um administrador por tempo limitado:
+
+    POST /admin/perfilador?limiar_ms=2000&duracao_s=600   (header X-Admin-Token)
+
+Enquanto armado, uma thread lê a pilha das threads de cada requisição em
+andamento a cada `intervalo_ms`. As requisições que passam de `limiar_ms`
+têm as pilhas gravadas em perfis/ no formato "folded" (uma pilha por linha,
+frames separados por ";" e o número de amostras no fim), que é a entrada do
+flamegraph.pl, do inferno e do speedscope:
+
+    flamegraph.pl perfis/20240131-101500_processar-nfes_183422ms.folded > chama.svg
+
+As threads de uma requisição são a do event loop que a atende e as do
+threadpool enquanto executam um span dela (ver rastreamento.py). A thread do
+event loop é compartilhada: com várias requisições ao mesmo tempo, o trecho
+dela no perfil também inclui o trabalho das outras.
+"""
+
+import os
+import re
+import secrets
+import sys
+import threading
+import time
+from collections import Counter
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+from fastapi import Header, HTTPException
+
+import rastreamento
+
+DIRETORIO_PERFIS = os.getenv("DIRETORIO_PERFIS", "perfis")
+MAX_PERFIS = int(os.getenv("MAX_PERFIS", "50"))
+
+LIMIAR_PADRAO_MS = 1000
+DURACAO_PADRAO_S = 600
+DURACAO_MAXIMA_S = 3600
+INTERVALO_PADRAO_MS = 10
+
+_NOME_PERFIL = re.compile(r"^[0-9A-Za-z_.-]+\.folded$")
+
+
+def exigir_admin(x_admin_token: Optional[str] = Header(None)) -> None:
+    """Dependência do FastAPI: rotas /admin só com o ADMIN_TOKEN do servidor."""
+    token = os.getenv("ADMIN_TOKEN")
+    if not token:
+        raise HTTPException(status_code=404, detail="Administração desabilitada (defina ADMIN_TOKEN)")
+    if not x_admin_token or not secrets.compare_digest(x_admin_token, token):
+        raise HTTPException(status_code=403, detail="X-Admin-Token inválido")
+
+
+@dataclass(slots=True)
+class Amostragem:
+    """Amostras de uma requisição: threads em uso e contagem de cada pilha."""
+
+    descricao: str
+    inicio: float
+    threads: Counter = field(default_factory=Counter)
+    pilhas: Counter = field(default_factory=Counter)
+    amostras: int = 0
+
+
+_amostragem_atual: ContextVar[Optional[Amostragem]] = ContextVar("amostragem_atual", default=None)
+
+
+class Perfilador:
+    def __init__(self, diretorio: str = DIRETORIO_PERFIS):
+        self.diretorio = diretorio
+        self.limiar_ms = LIMIAR_PADRAO_MS
+        self.intervalo_s = INTERVALO_PADRAO_MS / 1000
+        self.ate = 0.0
+        self.gravados = 0
+        self._ativas: Dict[int, Amostragem] = {}
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def armado(self) -> bool:
+        return time.monotonic() < self.ate
+
+    def armar(
+        self,
+        limiar_ms: int = LIMIAR_PADRAO_MS,
+        duracao_s: int = DURACAO_PADRAO_S,
+        intervalo_ms: int = INTERVALO_PADRAO_MS,
+    ) -> dict:
+        with self._lock:
+            self.limiar_ms = limiar_ms
+            self.intervalo_s = intervalo_ms / 1000
+            self.ate = time.monotonic() + min(duracao_s, DURACAO_MAXIMA_S)
+            rastreamento.registrar_gancho(_ao_entrar, _ao_sair)
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._laco, name="perfilador", daemon=True)
+                self._thread.start()
+        return self.estado()
+
+    def desarmar(self) -> dict:
+        with self._lock:
+            self.ate = 0.0
+        return self.estado()
+
+    def estado(self) -> dict:
+        restante = max(0.0, self.ate - time.monotonic())
+        return {
+            "armado": restante > 0,
+            "restante_s": round(restante),
+            "limiar_ms": self.limiar_ms,
+            "intervalo_ms": round(self.intervalo_s * 1000),
+            "requisicoes_em_amostragem": len(self._ativas),
+            "perfis_gravados": self.gravados,
+        }
+
+    def iniciar(self, descricao: str) -> Optional[Amostragem]:
+        """Começa a amostrar a requisição atual (None se não estiver armado)."""
+        if not self.armado:
+            return None
+        amostragem = Amostragem(descricao, time.monotonic())
+        amostragem.threads[threading.get_ident()] += 1
+        _amostragem_atual.set(amostragem)
+        with self._lock:
+            self._ativas[id(amostragem)] = amostragem
+        return amostragem
+
+    def parar(self, amostragem: Amostragem) -> None:
+        """Tira a requisição das amostradas (pode ser chamado mais de uma vez)."""
+        with self._lock:
+            self._ativas.pop(id(amostragem), None)
+
+    def finalizar(self, amostragem: Amostragem, duracao_ms: float, trace_id: str = "") -> Optional[str]:
+        """
+        Para de amostrar; grava o perfil se a requisição passou do limiar.
+        Grava em disco: no event loop, chame por run_in_threadpool depois de `parar`.
+        """
+        self.parar(amostragem)
+        if duracao_ms < self.limiar_ms or not amostragem.pilhas:
+            return None
+
+        slug = re.sub(r"[^0-9A-Za-z]+", "-", amostragem.descricao).strip("-") or "requisicao"
+        nome = f"{time.strftime('%Y%m%d-%H%M%S')}_{slug}_{int(duracao_ms)}ms"
+        if trace_id:
+            nome += f"_{trace_id[:8]}"
+        nome += ".folded"
+
+        os.makedirs(self.diretorio, exist_ok=True)
+        with open(os.path.join(self.diretorio, nome), "w", encoding="utf-8") as f:
+            for pilha, contagem in amostragem.pilhas.most_common():
+                f.write(f"{pilha} {contagem}\n")
+        self.gravados += 1
+        self._podar()
+        print(f"PERFIL GRAVADO: {nome} ({amostragem.amostras} amostras)")
+        return nome
+
+    def perfis(self) -> List[dict]:
+        if not os.path.isdir(self.diretorio):
+            return []
+        perfis = []
+        for nome in sorted(os.listdir(self.diretorio), reverse=True):
+            if _NOME_PERFIL.match(nome):
+                caminho = os.path.join(self.diretorio, nome)
+                perfis.append({"nome": nome, "bytes": os.path.getsize(caminho)})
+        return perfis
+
+    def caminho(self, nome: str) -> str:
+        caminho = os.path.join(self.diretorio, nome)
+        if not _NOME_PERFIL.match(nome) or not os.path.isfile(caminho):
+            raise KeyError(nome)
+        return caminho
+
+    def _podar(self) -> None:
+        for perfil in self.perfis()[MAX_PERFIS:]:
+            os.remove(os.path.join(self.diretorio, perfil["nome"]))
+
+    def _laco(self) -> None:
+        propria = threading.get_ident()
+        while True:
+            with self._lock:
+                # Sai só quando desarmado e sem requisição em amostragem
+                if not self.armado and not self._ativas:
+                    rastreamento.remover_gancho(_ao_entrar, _ao_sair)
+                    self._thread = None
+                    return
+                ativas = list(self._ativas.values())
+            time.sleep(self.intervalo_s)
+            if not ativas:
+                continue
+            frames = sys._current_frames()
+            nomes = {t.ident: t.name for t in threading.enumerate()}
+            for amostragem in ativas:
+                amostragem.amostras += 1
+                for ident in list(amostragem.threads):
+                    frame = frames.get(ident)
+                    if frame is not None and ident != propria:
+                        amostragem.pilhas[_dobrar(frame, nomes.get(ident, str(ident)))] += 1
+
+
+def _dobrar(frame, nome_thread: str) -> str:
+    """Pilha no formato folded: raiz primeiro, um frame por item."""
+    frames = []
+    while frame is not None:
+        codigo = frame.f_code
+        frames.append(f"{codigo.co_name} ({os.path.basename(codigo.co_filename)}:{frame.f_lineno})")
+        frame = frame.f_back
+    frames.append(f"thread {nome_thread}")
+    return ";".join(reversed(frames))
+
+
+def _ao_entrar(_span) -> None:
+    amostragem = _amostragem_atual.get()
+    if amostragem is not None:
+        amostragem.threads[threading.get_ident()] += 1
+
+
+def _ao_sair(_span) -> None:
+    amostragem = _amostragem_atual.get()
+    if amostragem is None:
+        return
+    ident = threading.get_ident()
+    amostragem.threads[ident] -= 1
+    if amostragem.threads[ident] <= 0:
+        del amostragem.threads[ident]
+
+
+perfilador = Perfilador()
@@ -0,0 +1,266 @@
+# rastreamento.py
+"""
+Rastreamento opcional das etapas de /processar-nfes, /resumo-ia e
+/gerar-relatorio-pdf, em spans no formato do OpenTelemetry (OTLP/JSON).
+
+Desligado por padrão; ligado pela variável RASTREAMENTO:
+- arquivo: grava em RASTREAMENTO_ARQUIVO (padrão traces.jsonl) um
+  ExportTraceServiceRequest por linha, como o file exporter do collector;
+- coletor: envia por OTLP/HTTP (JSON) para RASTREAMENTO_COLETOR_URL
+  (padrão http://127.0.0.1:4318/v1/traces), seja um OpenTelemetry
+  Collector ou o coletor_traces.py.
+
+O header `traceparent` (W3C) de entrada é respeitado, então os spans entram
+no mesmo trace de quem chamou. Sem exportador e sem ganchos (ver
+perfilador.py), `span()` não cria nada.
+"""
+
+import atexit
+import json
+import os
+import re
+import secrets
+import threading
+import time
+import urllib.request
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from functools import wraps
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+NOME_SERVICO = os.getenv("RASTREAMENTO_SERVICO", "fiscalia-pro")
+ESCOPO = "fiscalia.rastreamento"
+
+# Tipo do span (SpanKind do OTLP)
+TIPO_INTERNO = 1
+TIPO_SERVIDOR = 2
+
+_TRACEPARENT = re.compile(r"^00-([0-9a-f]{32})-([0-9a-f]{16})-[0-9a-f]{2}$")
+
+
+@dataclass(slots=True)
+class Span:
+    nome: str
+    trace_id: str
+    span_id: str
+    pai_id: str = ""
+    tipo: int = TIPO_INTERNO
+    inicio_ns: int = 0
+    fim_ns: int = 0
+    atributos: Dict[str, object] = field(default_factory=dict)
+    erro: Optional[str] = None
+
+    @property
+    def duracao_ms(self) -> float:
+        return (self.fim_ns - self.inicio_ns) / 1e6
+
+    @property
+    def traceparent(self) -> str:
+        return f"00-{self.trace_id}-{self.span_id}-01"
+
+    def como_otlp(self) -> dict:
+        span = {
+            "traceId": self.trace_id,
+            "spanId": self.span_id,
+            "name": self.nome,
+            "kind": self.tipo,
+            "startTimeUnixNano": str(self.inicio_ns),
+            "endTimeUnixNano": str(self.fim_ns),
+            "attributes": [_atributo_otlp(k, v) for k, v in self.atributos.items()],
+            "status": {"code": 2, "message": self.erro} if self.erro else {"code": 1},
+        }
+        if self.pai_id:
+            span["parentSpanId"] = self.pai_id
+        return span
+
+
+def _atributo_otlp(chave: str, valor) -> dict:
+    if isinstance(valor, bool):
+        return {"key": chave, "value": {"boolValue": valor}}
+    if isinstance(valor, int):
+        # OTLP/JSON: inteiros de 64 bits vão como string
+        return {"key": chave, "value": {"intValue": str(valor)}}
+    if isinstance(valor, float):
+        return {"key": chave, "value": {"doubleValue": valor}}
+    return {"key": chave, "value": {"stringValue": str(valor)}}
+
+
+def lote_otlp(spans: List[Span]) -> dict:
+    """ExportTraceServiceRequest (OTLP/JSON) com os spans."""
+    return {
+        "resourceSpans": [
+            {
+                "resource": {
+                    "attributes": [_atributo_otlp("service.name", NOME_SERVICO)],
+                },
+                "scopeSpans": [
+                    {"scope": {"name": ESCOPO}, "spans": [s.como_otlp() for s in spans]},
+                ],
+            }
+        ]
+    }
+
+
+class Exportador:
+    """
+    Junta os spans terminados e os envia em lote a cada `intervalo_s`
+    (ou a cada `tamanho_lote` spans), numa thread própria: a requisição
+    nunca espera por disco ou rede do rastreamento.
+    """
+
+    def __init__(
+        self,
+        destino: str,
+        caminho: str = "traces.jsonl",
+        url: str = "http://127.0.0.1:4318/v1/traces",
+        intervalo_s: float = 1.0,
+        tamanho_lote: int = 512,
+    ):
+        if destino not in ("arquivo", "coletor"):
+            raise ValueError(f"RASTREAMENTO desconhecido: {destino}")
+        self.destino = destino
+        self.caminho = caminho
+        self.url = url
+        self.intervalo_s = intervalo_s
+        self.tamanho_lote = tamanho_lote
+        self.exportados = 0
+        self.falhas = 0
+        self._pendentes: List[Span] = []
+        self._lock = threading.Lock()
+        self._acordar = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def enviar(self, span: Span) -> None:
+        with self._lock:
+            self._pendentes.append(span)
+            cheio = len(self._pendentes) >= self.tamanho_lote
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._laco, name="rastreamento-exportador", daemon=True
+                )
+                self._thread.start()
+        if cheio:
+            self._acordar.set()
+
+    def descarregar(self) -> None:
+        with self._lock:
+            spans, self._pendentes = self._pendentes, []
+        if not spans:
+            return
+        corpo = json.dumps(lote_otlp(spans), ensure_ascii=False)
+        try:
+            if self.destino == "arquivo":
+                with open(self.caminho, "a", encoding="utf-8") as f:
+                    f.write(corpo + "\n")
+            else:
+                requisicao = urllib.request.Request(
+                    self.url,
+                    data=corpo.encode("utf-8"),
+                    headers={"Content-Type": "application/json"},
+                    method="POST",
+                )
+                urllib.request.urlopen(requisicao, timeout=5).close()
+            self.exportados += len(spans)
+        except Exception as e:
+            # Rastreamento é acessório: perde o lote, mas não derruba nada
+            self.falhas += len(spans)
+            print("ERRO AO EXPORTAR SPANS:", repr(e))
+
+    def _laco(self) -> None:
+        while True:
+            self._acordar.wait(self.intervalo_s)
+            self._acordar.clear()
+            self.descarregar()
+
+
+def _criar_exportador() -> Optional[Exportador]:
+    destino = os.getenv("RASTREAMENTO", "").lower()
+    if not destino:
+        return None
+    exportador = Exportador(
+        destino,
+        caminho=os.getenv("RASTREAMENTO_ARQUIVO", "traces.jsonl"),
+        url=os.getenv("RASTREAMENTO_COLETOR_URL", "http://127.0.0.1:4318/v1/traces"),
+    )
+    atexit.register(exportador.descarregar)
+    return exportador
+
+
+exportador = _criar_exportador()
+
+# Ganchos chamados ao entrar/sair de cada span, na thread que executa o span
+# (usados pelo perfilador para saber quais threads trabalham na requisição)
+_ganchos: List[Tuple[Callable[[Span], None], Callable[[Span], None]]] = []
+
+_span_atual: ContextVar[Optional[Span]] = ContextVar("span_atual", default=None)
+
+
+def habilitado() -> bool:
+    return exportador is not None or bool(_ganchos)
+
+
+def registrar_gancho(ao_entrar: Callable[[Span], None], ao_sair: Callable[[Span], None]) -> None:
+    if (ao_entrar, ao_sair) not in _ganchos:
+        _ganchos.append((ao_entrar, ao_sair))
+
+
+def remover_gancho(ao_entrar: Callable[[Span], None], ao_sair: Callable[[Span], None]) -> None:
+    if (ao_entrar, ao_sair) in _ganchos:
+        _ganchos.remove((ao_entrar, ao_sair))
+
+
+def span_atual() -> Optional[Span]:
+    return _span_atual.get()
+
+
+@contextmanager
+def span(
+    nome: str, traceparent: Optional[str] = None, tipo: int = TIPO_INTERNO, **atributos
+) -> Iterator[Optional[Span]]:
+    """
+    Span filho do span atual (ou raiz, continuando `traceparent` se vier).
+    Atributos podem ser acrescentados em `s.atributos` dentro do bloco.
+    Com o rastreamento desligado, devolve None e não mede nada.
+    """
+    if not habilitado():
+        yield None
+        return
+
+    pai = _span_atual.get()
+    if pai is not None:
+        trace_id, pai_id = pai.trace_id, pai.span_id
+    else:
+        m = _TRACEPARENT.match(traceparent or "")
+        trace_id, pai_id = (m.group(1), m.group(2)) if m else (secrets.token_hex(16), "")
+
+    atual = Span(nome, trace_id, secrets.token_hex(8), pai_id, tipo, time.time_ns(), 0, atributos)
+    token = _span_atual.set(atual)
+    for ao_entrar, _ in list(_ganchos):
+        ao_entrar(atual)
+    try:
+        yield atual
+    except BaseException as e:
+        atual.erro = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        atual.fim_ns = time.time_ns()
+        for _, ao_sair in list(_ganchos):
+            ao_sair(atual)
+        _span_atual.reset(token)
+        if exportador is not None:
+            exportador.enviar(atual)
+
+
+def rastreado(nome: str):
+    """Decorador: executa a função dentro de um span com esse nome."""
+
+    def decorar(funcao):
+        @wraps(funcao)
+        def executar(*args, **kwargs):
+            with span(nome):
+                return funcao(*args, **kwargs)
+
+        return executar
+
+    return decorar
@@ -0,0 +1,129 @@
+# stub_llm.py
+"""
+Servidor local que imita a API de chat da Groq/OpenAI, para testar e
+medir o /resumo-ia sem rede e sem chave de API.
+
+    uvicorn stub_llm:app --port 8001
+    LLM_BACKEND=stub LLM_STUB_URL=http://127.0.0.1:8001 uvicorn main:app
+
+Comportamento configurável por variável de ambiente:
+- STUB_LATENCIA_MS      latência fixa de cada resposta (padrão 300)
+- STUB_JITTER_MS        variação aleatória somada à latência (padrão 0)
+- STUB_ATRASO_TOKEN_MS  intervalo entre pedaços no modo stream (padrão 20)
+- STUB_LIMITE_RPS       requisições/s aceitas antes de responder 429 (0 = sem limite)
+- STUB_SEMENTE          semente do jitter, para execuções reproduzíveis
+
+A resposta é determinística: o mesmo prompt sempre gera o mesmo texto.
+"""
+
+import asyncio
+import json
+import os
+import random
+import time
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+from llm import texto_deterministico
+
+LATENCIA_MS = float(os.getenv("STUB_LATENCIA_MS", "300"))
+JITTER_MS = float(os.getenv("STUB_JITTER_MS", "0"))
+ATRASO_TOKEN_MS = float(os.getenv("STUB_ATRASO_TOKEN_MS", "20"))
+LIMITE_RPS = float(os.getenv("STUB_LIMITE_RPS", "0"))
+
+_aleatorio = random.Random(int(os.getenv("STUB_SEMENTE", "42")))
+
+app = FastAPI(title="Stub LLM (FiscalIA Pro)")
+
+
+class BaldeTokens:
+    """Limite de taxa simples (token bucket) para simular o 429 do provedor."""
+
+    def __init__(self, taxa: float):
+        self.taxa = taxa
+        self.capacidade = max(taxa, 1.0)
+        self.tokens = self.capacidade
+        self.atualizado = time.monotonic()
+
+    def consumir(self) -> float:
+        """0 se a requisição pode passar; senão, segundos até haver token."""
+        if self.taxa <= 0:
+            return 0.0
+        agora = time.monotonic()
+        self.tokens = min(self.capacidade, self.tokens + (agora - self.atualizado) * self.taxa)
+        self.atualizado = agora
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        return (1 - self.tokens) / self.taxa
+
+
+balde = BaldeTokens(LIMITE_RPS)
+contadores = {"requisicoes": 0, "limitadas": 0}
+
+
+@app.post("/openai/v1/chat/completions")
+async def chat_completions(request: Request):
+    corpo = await request.json()
+    contadores["requisicoes"] += 1
+
+    espera = balde.consumir()
+    if espera:
+        contadores["limitadas"] += 1
+        return JSONResponse(
+            status_code=429,
+            content={"error": {"message": "Rate limit reached (stub)", "type": "rate_limit_exceeded"}},
+            headers={"retry-after": str(max(1, round(espera)))},
+        )
+
+    await asyncio.sleep((LATENCIA_MS + _aleatorio.uniform(0, JITTER_MS)) / 1000)
+
+    modelo = corpo.get("model", "stub")
+    texto = texto_deterministico(corpo.get("messages", []))
+    criado = int(time.time())
+    id_resposta = f"chatcmpl-stub-{contadores['requisicoes']}"
+
+    if corpo.get("stream"):
+        return StreamingResponse(
+            _stream(id_resposta, modelo, criado, texto), media_type="text/event-stream"
+        )
+
+    return {
+        "id": id_resposta,
+        "object": "chat.completion",
+        "created": criado,
+        "model": modelo,
+        "choices": [
+            {
+                "index": 0,
+                "message": {"role": "assistant", "content": texto},
+                "finish_reason": "stop",
+            }
+        ],
+        "usage": {"prompt_tokens": 0, "completion_tokens": len(texto.split()), "total_tokens": 0},
+    }
+
+
+async def _stream(id_resposta: str, modelo: str, criado: int, texto: str):
+    def evento(delta: dict, finish_reason=None) -> str:
+        chunk = {
+            "id": id_resposta,
+            "object": "chat.completion.chunk",
+            "created": criado,
+            "model": modelo,
+            "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+        }
+        return f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n"
+
+    yield evento({"role": "assistant", "content": ""})
+    for palavra in texto.split(" "):
+        await asyncio.sleep(ATRASO_TOKEN_MS / 1000)
+        yield evento({"content": palavra + " "})
+    yield evento({}, finish_reason="stop")
+    yield "data: [DONE]\n\n"
+
+
+@app.get("/estatisticas")
+async def estatisticas():
+    return contadores
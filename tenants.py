@@ -0,0 +1,172 @@
+# tenants.py
+
+import os
+import re
+import secrets
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import Callable, Dict, Generic, List, Optional, TypeVar
+
+from fastapi import Header, HTTPException
+
+# Empresa cliente (tenant) de cada requisição, informada no header X-Tenant-Id.
+# Sem header, tudo vai para o tenant padrão (uso com uma empresa só).
+TENANT_PADRAO = "padrao"
+
+_TENANT_VALIDO = re.compile(r"^[A-Za-z0-9_-]{1,64}$")
+
+# Estado em memória: acima de MAX_TENANTS_EM_MEMORIA, os tenants sem uso há
+# TENANT_OCIOSO_S segundos são descartados (e recarregados do disco se voltarem)
+MAX_TENANTS_EM_MEMORIA = int(os.getenv("MAX_TENANTS_EM_MEMORIA", "256"))
+TENANT_OCIOSO_S = float(os.getenv("TENANT_OCIOSO_S", "600"))
+
+T = TypeVar("T")
+
+
+def tenant_valido(tenant: str) -> bool:
+    # O tenant vira nome de pasta: nada de "/", ".." etc.
+    return bool(_TENANT_VALIDO.match(tenant))
+
+
+def _tenants_habilitados(valor: Optional[str]) -> Dict[str, Optional[str]]:
+    """
+    TENANTS="acme,beta" ou, com token por tenant, "acme:token1,beta:token2"
+    -> {tenant: token ou None}. Sem TENANTS, só o tenant padrão.
+    """
+    if not valor:
+        return {TENANT_PADRAO: None}
+    habilitados = {}
+    for entrada in valor.split(","):
+        tenant, _, token = entrada.strip().partition(":")
+        if not tenant_valido(tenant):
+            raise ValueError(f"TENANTS: tenant inválido: {tenant!r}")
+        habilitados[tenant] = token or None
+    return habilitados
+
+
+TENANTS_HABILITADOS = _tenants_habilitados(os.getenv("TENANTS"))
+
+
+def obter_tenant(
+    x_tenant_id: Optional[str] = Header(None), x_tenant_token: Optional[str] = Header(None)
+) -> str:
+    """
+    Dependência do FastAPI: tenant da requisição (header X-Tenant-Id), só
+    entre os habilitados em TENANTS e, se o tenant tem token, com o
+    X-Tenant-Token certo. Um cliente não cria tenants trocando o header.
+    """
+    tenant = x_tenant_id or TENANT_PADRAO
+    if not tenant_valido(tenant):
+        raise HTTPException(status_code=400, detail=f"X-Tenant-Id inválido: {tenant}")
+    if tenant not in TENANTS_HABILITADOS:
+        raise HTTPException(status_code=403, detail=f"Tenant não habilitado: {tenant}")
+    token = TENANTS_HABILITADOS[tenant]
+    if token and not (x_tenant_token and secrets.compare_digest(x_tenant_token, token)):
+        raise HTTPException(status_code=403, detail="X-Tenant-Token inválido")
+    return tenant
+
+
+class PorTenant(Generic[T]):
+    """
+    Uma instância independente de T por tenant, criada no primeiro uso por
+    `fabrica(tenant)` (que pode carregar o estado salvo do tenant).
+    Cada tenant tem seus próprios dados e travas, e a fábrica roda fora da
+    trava comum: a carga de um não bloqueia as consultas dos outros. Como ela
+    pode ler o disco, rotas async chamam por run_in_threadpool.
+
+    `[tenant]` cria a instância (caminho de escrita); `obter(tenant)` só a
+    carrega se `tem_dados(tenant)` diz que há estado salvo, senão devolve
+    None: consultas não criam estado. Acima de `capacidade` instâncias, as
+    menos usadas, paradas há `ocioso_s` segundos e aceitas por `ocioso`
+    (ex.: sem bytes em voo) são descartadas.
+    """
+
+    def __init__(
+        self,
+        fabrica: Callable[[str], T],
+        tem_dados: Optional[Callable[[str], bool]] = None,
+        ocioso: Optional[Callable[[T], bool]] = None,
+        capacidade: int = MAX_TENANTS_EM_MEMORIA,
+        ocioso_s: float = TENANT_OCIOSO_S,
+    ):
+        self._fabrica = fabrica
+        self._tem_dados = tem_dados
+        self._ocioso = ocioso
+        self.capacidade = capacidade
+        self.ocioso_s = ocioso_s
+        # tenant -> instância, do uso mais antigo ao mais recente
+        self._instancias: "OrderedDict[str, T]" = OrderedDict()
+        self._usos: Dict[str, float] = {}
+        self._carregando: Dict[str, "Future[T]"] = {}
+        self._lock = threading.Lock()
+
+    def __getitem__(self, tenant: str) -> T:
+        instancia = self._usar(tenant)
+        if instancia is None:
+            instancia = self._criar(tenant)
+        return instancia
+
+    def obter(self, tenant: str) -> Optional[T]:
+        """Instância do tenant sem criar estado novo (None se ele não tem dados)."""
+        instancia = self._usar(tenant)
+        if instancia is None and self._tem_dados is not None and self._tem_dados(tenant):
+            instancia = self._criar(tenant)
+        return instancia
+
+    def _usar(self, tenant: str) -> Optional[T]:
+        with self._lock:
+            instancia = self._instancias.get(tenant)
+            if instancia is not None:
+                self._instancias.move_to_end(tenant)
+                self._usos[tenant] = time.monotonic()
+            return instancia
+
+    def _criar(self, tenant: str) -> T:
+        # A fábrica (que pode reler o disco do tenant) roda fora da trava
+        # global: só quem pede o mesmo tenant espera pela carga
+        with self._lock:
+            instancia = self._instancias.get(tenant)
+            if instancia is not None:
+                self._usos[tenant] = time.monotonic()
+                return instancia
+            carga = self._carregando.get(tenant)
+            dono = carga is None
+            if dono:
+                carga = self._carregando[tenant] = Future()
+        if not dono:
+            return carga.result()
+
+        try:
+            instancia = self._fabrica(tenant)
+        except BaseException as e:
+            with self._lock:
+                self._carregando.pop(tenant, None)
+            carga.set_exception(e)
+            raise
+        with self._lock:
+            self._instancias[tenant] = instancia
+            self._usos[tenant] = time.monotonic()
+            self._carregando.pop(tenant, None)
+            self._descartar_ociosos()
+        carga.set_result(instancia)
+        return instancia
+
+    def _descartar_ociosos(self) -> None:
+        excedente = len(self._instancias) - self.capacidade
+        if excedente <= 0:
+            return
+        limite = time.monotonic() - self.ocioso_s
+        for tenant in list(self._instancias):
+            if excedente <= 0 or self._usos.get(tenant, 0.0) > limite:
+                # Ordem de uso: daqui em diante ninguém está parado há tempo suficiente
+                break
+            if self._ocioso is None or self._ocioso(self._instancias[tenant]):
+                del self._instancias[tenant]
+                self._usos.pop(tenant, None)
+                excedente -= 1
+
+    def tenants(self) -> List[str]:
+        with self._lock:
+            return sorted(self._instancias)